@@ -4,11 +4,25 @@ from gerbonara.aperture_macros.parse import ApertureMacro as GBApertureMacro
 #Module for storing gerber apertures
 
 class ApertureDefinition:
-    def __init__(self, code, shape, params,units):
+    # one shared, read-only instance per D-code; scaled variants are memoized per (sx, sy)
+    __slots__ = ('code', 'shape', 'params', 'units', 'macro', '_scaled', '__weakref__')
+
+    def __init__(self, code, shape, params,units, macro=None):
         self.code = code   
         self.shape = shape
-        self.params = params
+        self.params = tuple(params)
         self.units=units
+        self.macro = macro
+        self._scaled = {}
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"ApertureDefinition({self.code}, {self.shape!r}, {list(self.params)})"
 
     @staticmethod
     def parse(line, units):
@@ -42,12 +56,16 @@ class ApertureDefinition:
     
     @staticmethod
     def from_macro(code, macro, params, units):
-        inst = ApertureDefinition(code, 'MACRO', params, units)
-        inst.macro      = macro
-        inst.params     = params
+        return ApertureDefinition(code, 'MACRO', params, units, macro)
+
+    def scale(self, sx, sy):
+        key = (sx, sy)
+        inst = self._scaled.get(key)
+        if inst is None:
+            inst = self._scaled[key] = self._scale(sx, sy)
         return inst
        
-    def scale(self, sx, sy):
+    def _scale(self, sx, sy):
         if self.shape == 'MACRO':
             
             new_params = [p * sx for p in self.params]
@@ -59,23 +77,44 @@ class ApertureDefinition:
         if self.shape == 'C':
             
             d = self.params[0]
-            return ApertureDefinition(self.code, 'O', [d*sx, d*sy])
+            if sx == sy:
+                # a circle stays a circle, so the code can still be used for traces
+                return ApertureDefinition(self.code, 'C', [p*sx for p in self.params], self.units)
+            return ApertureDefinition(self.code, 'O', [d*sx, d*sy], self.units)
         elif self.shape == 'R':
             w, h = self.params[:2]
-            return ApertureDefinition(self.code, 'R', [w*sx, h*sy])
+            return ApertureDefinition(self.code, 'R', [w*sx, h*sy], self.units)
         elif self.shape == 'O':
             L, W = self.params[:2]
-            return ApertureDefinition(self.code, 'O', [L*sx, W*sy])
+            return ApertureDefinition(self.code, 'O', [L*sx, W*sy], self.units)
         elif self.shape == 'P':
             
             diam = self.params[0] * sx
             rest = self.params[1:]
-            return ApertureDefinition(self.code, 'P', [diam] + rest)
+            return ApertureDefinition(self.code, 'P', [diam] + list(rest), self.units)
         else:
             
             return ApertureDefinition(self.code,
                                       self.shape,
-                                      [p*sx for p in self.params])
-        
+                                      [p*sx for p in self.params],
+                                      self.units)
+
+
+class ApertureTable(dict):
+    # D-code -> canonical ApertureDefinition, shared by every command that uses it
+
+    def intern(self, aperture):
+        # a repeated identical definition keeps the instance commands already share;
+        # a different one replaces it, as the last %AD for a D-code wins
+        current = self.get(aperture.code)
+        if (current is not None and current.shape == aperture.shape and current.params == aperture.params
+                and current.units == aperture.units and current.macro is aperture.macro):
+            return current
+        self[aperture.code] = aperture
+        return aperture
 
+    def scale(self, code, sx, sy):
+        return self[code].scale(sx, sy)
 
+    def scaled(self, sx, sy):
+        return ApertureTable((code, ap.scale(sx, sy)) for code, ap in self.items())
@@ -2,10 +2,19 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from parser import GerberParser
 from transformer import ScaleTransformer
-from plotter import CombinedGeometryPlotter
+from plotter import LivePreviewPlotter
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 from exporter import DXFExporter, Pdf_Exporter
+from gerber_writer import GerberExporter
+from svg_writer import SVGExporter
+from excellon import ExcellonParser, is_drill_name
+from export_pipeline import GeometrySnapshot, ExportOrchestrator
+from watch import IncrementalParser, FileWatcher
+from sweep import LinearScaler
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
 
 class GeometryApp(tk.Tk):
     def __init__(self):
@@ -17,39 +26,83 @@ class GeometryApp(tk.Tk):
         self.columnconfigure(0, weight=1)
 
         self.cmds = []
+        self.apertures = {}
+        self.drills = None
         self.file_path = tk.StringVar()
         self.scale_x_var = tk.StringVar(value="1.0")
         self.scale_y_var = tk.StringVar(value="1.0")
+        self.stroke_var = tk.BooleanVar(value=False)
+        self.live_var = tk.BooleanVar(value=True)
+        self.watch_var = tk.BooleanVar(value=False)
+        # watch mode: the parser keeps checkpoints between runs, exports made in the
+        # session are written again after every change
+        self._watcher = None
+        self._watch_parser = None
+        self._watch_exports = {}
         self.scaledPoints = []
+        self.orig_geom = []
+        self.transformer = None
+        self._scaler = None
+        self._pending_preview = None
+        # one background thread for the whole session runs the export orchestrator,
+        # whose worker processes are spawned rather than forked from this threaded process
+        self._exports = ThreadPoolExecutor(max_workers=1)
+        self.protocol("WM_DELETE_WINDOW", self._close)
         self._build_ui()
+        self.scale_x_var.trace_add("write", lambda *args: self._schedule_preview())
+        self.scale_y_var.trace_add("write", lambda *args: self._schedule_preview())
 
     def _build_ui(self):
         frm = ttk.Frame(self, padding=10)
         frm.grid(row=0, column=0, sticky='nsew')
 
-        frm.rowconfigure(3, weight=1)
+        frm.rowconfigure(4, weight=1)
         for i in range(4):
             frm.columnconfigure(i, weight=1)
 
         ttk.Label(frm, text="Gerber File:").grid(row=0, column=0, sticky=tk.W)
         ttk.Entry(frm, textvariable=self.file_path, width=60).grid(row=0, column=1, padx=5)
         ttk.Button(frm, text="Browse", command=self._select_file).grid(row=0, column=2)
+        ttk.Checkbutton(frm, text="Watch file", variable=self.watch_var,
+                        command=self._toggle_watch).grid(row=0, column=3, sticky=tk.W)
         
         ttk.Label(frm, text="Scale X:").grid(row=1, column=0, sticky=tk.W)
-        ttk.Entry(frm, textvariable=self.scale_x_var, width=8).grid(row=1, column=1, sticky=tk.W)
+        ttk.Spinbox(frm, textvariable=self.scale_x_var, from_=0.5, to=2.0, increment=0.0005,
+                    width=8).grid(row=1, column=1, sticky=tk.W)
         ttk.Label(frm, text="Scale Y:").grid(row=1, column=2, sticky=tk.W)
-        ttk.Entry(frm, textvariable=self.scale_y_var, width=8).grid(row=1, column=3, sticky=tk.W)
+        ttk.Spinbox(frm, textvariable=self.scale_y_var, from_=0.5, to=2.0, increment=0.0005,
+                    width=8).grid(row=1, column=3, sticky=tk.W)
+        ttk.Checkbutton(frm, text="Trace width", variable=self.stroke_var).grid(row=2, column=0, sticky=tk.W)
+        ttk.Checkbutton(frm, text="Live preview", variable=self.live_var).grid(row=2, column=1, sticky=tk.W)
 
-        ttk.Button(frm, text="Run", command=self._run).grid(row=2, column=1, columnspan=2, pady=10)
-        ttk.Button(frm, text="Export DXF", command=self._export_dxf).grid(row=2, column=0, columnspan=2, pady=10)
-        ttk.Button(frm, text="Export PDF", command=self._export_pdf).grid(row=2, column=3, sticky="W")
+        # the buttons get their own frame, so they never share a cell with the scale inputs
+        buttons = ttk.Frame(frm)
+        buttons.grid(row=3, column=0, columnspan=4, pady=10)
+        ttk.Button(buttons, text="Run", command=self._run).grid(row=0, column=0, padx=2)
+        ttk.Button(buttons, text="Export DXF", command=self._export_dxf).grid(row=0, column=1, padx=2)
+        ttk.Button(buttons, text="Export PDF", command=self._export_pdf).grid(row=0, column=2, padx=2)
+        ttk.Button(buttons, text="Export Gerber", command=self._export_gerber).grid(row=0, column=3, padx=2)
+        ttk.Button(buttons, text="Export SVG", command=self._export_svg).grid(row=0, column=4, padx=2)
+        ttk.Button(buttons, text="Export DXF + PDF", command=self._export_all).grid(row=0, column=5, padx=2)
 
         self.mst = frm
 
+        # one figure, canvas and toolbar for the whole session
+        self.fig = Figure(figsize=(6, 6))
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=frm)
+        self.canvas.get_tk_widget().grid(row=4, column=0, columnspan=4, sticky='nsew')
+        toolbar_frame = ttk.Frame(frm)
+        toolbar_frame.grid(row=5, column=0, columnspan=4, sticky='ew')
+        self.toolbar = NavigationToolbar2Tk(self.canvas, toolbar_frame)
+        self.toolbar.update()
+        self.preview = LivePreviewPlotter(self.ax, self.canvas)
+
     def _select_file(self):
         path = filedialog.askopenfilename(
             title="Select Gerber",
-            filetypes=(("Gerber Files", ("*.gbr","*.GTL","*.GBR","*.GTP")), ("All Files","*.*"))
+            filetypes=(("Gerber Files", ("*.gbr","*.GTL","*.GBR","*.GTP","*.gz")),
+                       ("Drill Files", ("*.drl","*.DRL","*.xln","*.exc")), ("All Files","*.*"))
         )
         if path:
             self.file_path.set(path)
@@ -67,27 +120,52 @@ class GeometryApp(tk.Tk):
             messagebox.showerror("Invalid scale", "Scale X and Y must be numbers.")
             return
 
-        parser = GerberParser(path)
-        orig_cmds = parser.run()
-        transformer = ScaleTransformer(sx, sy)
-        self.cmds = orig_cmds
-        orig_geom, scaled_geom, scaled_apts = transformer.apply(orig_cmds, [])
+        if is_drill_name(path):
+            # slots and routes only have a width once stroked, so drill runs always stroke
+            self.drills = ExcellonParser(path).run()
+            self.transformer = ScaleTransformer(sx, sy, stroke=True)
+            self.cmds = []
+            self.apertures = {}
+            orig_geom, scaled_geom = self.transformer.apply_drills(self.drills)
+        else:
+            parser = self._parser_for(path)
+            orig_cmds = parser.run()
+            self.drills = None
+            self.transformer = ScaleTransformer(sx, sy, stroke=self.stroke_var.get())
+            self.cmds = orig_cmds
+            self.apertures = parser.apertures
+            orig_geom, scaled_geom, scaled_apts = self.transformer.apply(orig_cmds, [])
+        self.orig_geom = orig_geom
         self.scaledPoints = scaled_geom
+        # growth directions for the live preview, worked out once per run
+        self._scaler = LinearScaler(orig_geom) if self.transformer.method == 'normal' else None
 
-        fig = Figure(figsize=(6, 6))
-        ax = fig.add_subplot(111)
-        plotter = CombinedGeometryPlotter(orig_geom, scaled_geom, ax=ax)
-        plotter.plot()
-        ax.invert_yaxis()
+        self.preview.set_original(orig_geom)
+        self.ax.invert_yaxis()
+        self.preview.update_scaled(scaled_geom)
+        if self.watch_var.get():
+            self._start_watch(path)
 
-        canvas = FigureCanvasTkAgg(fig, master=self.mst)
-        canvas.draw()
-        canvas.get_tk_widget().grid(row=3, column=0, columnspan=4, sticky='nsew')
+    def _schedule_preview(self):
+        # coalesce spinbox/typing events into one update per idle cycle
+        if self._pending_preview is None and self.live_var.get() and self.transformer is not None:
+            self._pending_preview = self.after_idle(self._live_preview)
 
-        toolbar_frame = ttk.Frame(self.mst)
-        toolbar_frame.grid(row=4, column=0, columnspan=4, sticky='ew')
-        toolbar = NavigationToolbar2Tk(canvas, toolbar_frame)
-        toolbar.update()
+    def _live_preview(self):
+        self._pending_preview = None
+        try:
+            sx = float(self.scale_x_var.get())
+            sy = float(self.scale_y_var.get())
+        except ValueError:
+            return
+        self.transformer.sx, self.transformer.sy = sx, sy
+        if self._scaler is None:
+            self.scaledPoints = self.transformer.scale(self.orig_geom)
+        else:
+            self.scaledPoints = self._scaler.scale(sx, sy)
+            if self.transformer.stroke and self.scaledPoints is not self.orig_geom:
+                self.transformer._stroke(self.scaledPoints, sx, sy)
+        self.preview.update_scaled(self.scaledPoints)
 
     def _export_dxf(self):
         output_filename = filedialog.asksaveasfilename(
@@ -97,15 +175,144 @@ class GeometryApp(tk.Tk):
         )
         if output_filename:
             try:
-                exp = DXFExporter(self.scale_x_var.get(), self.scale_y_var.get(), output_filename, self.cmds)
+                exp = DXFExporter(self.scale_x_var.get(), self.scale_y_var.get(), output_filename, self.cmds,
+                                  stroke=self.stroke_var.get(), geometries=self._drill_geometries())
                 exp.export()
+                self._watch_exports['dxf'] = output_filename
                 messagebox.showinfo("Success", f"DXF file exported to: {output_filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Error exporting DXF: {e}")
 
+    def _drill_geometries(self):
+        # drill data has no gerber commands to rebuild from, the exporters take the geometry
+        return self.scaledPoints if self.drills is not None else None
+
+    def _export_gerber(self):
+        if self.drills is not None:
+            messagebox.showwarning("Drill file", "Gerber export is not available for drill files.")
+            return
+        output_filename = filedialog.asksaveasfilename(
+            defaultextension=".gbr",
+            filetypes=(("Gerber Files", "*.gbr"), ("All Files", "*.*")),
+            title="Save Gerber File"
+        )
+        if output_filename:
+            try:
+                exp = GerberExporter(self.scale_x_var.get(), self.scale_y_var.get(), output_filename,
+                                     self.cmds, self.apertures)
+                exp.export()
+                self._watch_exports['gerber'] = output_filename
+                messagebox.showinfo("Success", f"Gerber file exported to: {output_filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Error exporting Gerber: {e}")
+
+    def _export_svg(self):
+        output_filename = filedialog.asksaveasfilename(
+            defaultextension=".svg",
+            filetypes=(("SVG Files", "*.svg"), ("All Files", "*.*")),
+            title="Save SVG File"
+        )
+        if output_filename:
+            try:
+                exp = SVGExporter(self.scale_x_var.get(), self.scale_y_var.get(), output_filename, self.cmds,
+                                  stroke=self.stroke_var.get(), geometries=self._drill_geometries())
+                exp.export()
+                self._watch_exports['svg'] = output_filename
+                messagebox.showinfo("Success", f"SVG file exported to: {output_filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Error exporting SVG: {e}")
+
+    def _export_all(self):
+        if not self.scaledPoints:
+            messagebox.showwarning("Nothing to export", "Run a Gerber file first.")
+            return
+        output_filename = filedialog.asksaveasfilename(
+            defaultextension=".dxf",
+            filetypes=(("DXF Files", "*.dxf"), ("All Files", "*.*")),
+            title="Save DXF and PDF"
+        )
+        if not output_filename:
+            return
+        base = os.path.splitext(output_filename)[0]
+        self._watch_exports.update(dxf=base + '.dxf', pdf=base + '.pdf')
+        snapshot = GeometrySnapshot(self.scaledPoints, self.transformer.sx, self.transformer.sy,
+                                    self.cmds, self.apertures)
+        orchestrator = ExportOrchestrator(snapshot, start_method='spawn')
+        # the exporters run in worker processes; the UI only polls for the result
+        future = self._exports.submit(orchestrator.run, {'dxf': base + '.dxf', 'pdf': base + '.pdf'})
+        self.after(100, self._poll_export, future, base)
+
+    def _poll_export(self, future, base):
+        if not future.done():
+            self.after(100, self._poll_export, future, base)
+            return
+        try:
+            timings = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Error exporting: {e}")
+            return
+        summary = ", ".join(f"{fmt} {sec:.2f}s" for fmt, sec in timings.items())
+        messagebox.showinfo("Success", f"Exported {base}.dxf and {base}.pdf ({summary})")
+
+    def _parser_for(self, path):
+        if not self.watch_var.get():
+            return GerberParser(path)
+        if self._watch_parser is None or self._watch_parser.filepath != path:
+            self._watch_parser = IncrementalParser(path)
+        return self._watch_parser
+
+    def _toggle_watch(self):
+        if self.watch_var.get() and self.file_path.get() and self.transformer is not None:
+            self._start_watch(self.file_path.get())
+
+    def _start_watch(self, path):
+        if self._watcher is not None and self._watcher.path == path:
+            return
+        polling = self._watcher is not None
+        self._watcher = FileWatcher(path)
+        if not polling:
+            self.after(500, self._poll_watch)
+
+    def _poll_watch(self):
+        if not self.watch_var.get():
+            self._watcher = None
+            return
+        if self._watcher.poll():
+            self._run()
+            self._rerun_exports()
+        self.after(500, self._poll_watch)
+
+    def _rerun_exports(self):
+        targets = dict(self._watch_exports)
+        if not targets or not self.scaledPoints:
+            return
+        if self.drills is not None:
+            targets.pop('gerber', None)
+        snapshot = GeometrySnapshot(self.scaledPoints, self.transformer.sx, self.transformer.sy,
+                                    self.cmds, self.apertures)
+        future = self._exports.submit(ExportOrchestrator(snapshot, start_method='spawn').run, targets)
+        self.after(100, self._poll_watch_export, future)
+
+    def _poll_watch_export(self, future):
+        # quiet on success, the plot already shows the change
+        if not future.done():
+            self.after(100, self._poll_watch_export, future)
+            return
+        try:
+            future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Error re-exporting after file change: {e}")
+
     def _export_pdf(self):
         Pdf_Exporter(self.master, self.scaledPoints)
 
+    def _close(self):
+        # queued exports are dropped, a running one finishes before the process exits
+        self._exports.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
 if __name__ == "__main__":
+    # spawned export workers of the standalone build start through here
+    multiprocessing.freeze_support()
     app = GeometryApp()
     app.mainloop()
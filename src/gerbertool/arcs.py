@@ -0,0 +1,68 @@
+import numpy as np
+
+#Module for tessellating many circular arcs at once into one packed vertex buffer
+
+# vertices for a full circle, arcs get a share proportional to their sweep
+CIRCLE_POINTS = 64
+
+
+def arc_sweeps(starts, ends, centers, clockwise):
+    # start angle, signed sweep and radius of every arc as (N,) arrays
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    clockwise = np.asarray(clockwise, dtype=bool).reshape(-1)
+    v0 = starts - centers
+    v1 = ends - centers
+    a0 = np.arctan2(v0[:, 1], v0[:, 0])
+    a1 = np.arctan2(v1[:, 1], v1[:, 0])
+    radius = np.hypot(v0[:, 0], v0[:, 1])
+
+    # counter-clockwise sweep in (0, 2pi], clockwise in [-2pi, 0)
+    ccw = np.mod(a1 - a0, 2*np.pi)
+    # start == end is a full circle in multi quadrant mode
+    full = np.all(np.isclose(starts, ends), axis=1)
+    ccw[full] = 2*np.pi
+    ccw[(ccw == 0) & ~full] = 2*np.pi
+    sweep = np.where(clockwise, ccw - 2*np.pi, ccw)
+    sweep[full & clockwise] = -2*np.pi
+    return a0, sweep, radius
+
+
+def _counts(sweep, circle_points):
+    return np.maximum(np.ceil(np.abs(sweep) / (2*np.pi) * circle_points).astype(np.int64), 1) + 1
+
+
+def arc_vertex_counts(starts, ends, centers, clockwise, circle_points=CIRCLE_POINTS):
+    # vertices tessellate_arcs will produce per arc, without producing them
+    return _counts(arc_sweeps(starts, ends, centers, clockwise)[1], circle_points)
+
+
+def tessellate_arcs(starts, ends, centers, clockwise, circle_points=CIRCLE_POINTS):
+    # returns an (M, 2) vertex buffer and (N+1,) offsets, arc k is vertices[offsets[k]:offsets[k+1]]
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    a0, sweep, radius = arc_sweeps(starts, ends, centers, clockwise)
+    counts = _counts(sweep, circle_points)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    arc = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(offsets[-1]) - offsets[arc]
+    theta = a0[arc] + sweep[arc] * (step / (counts[arc] - 1))
+    vertices = centers[arc] + radius[arc, None] * np.column_stack([np.cos(theta), np.sin(theta)])
+    return vertices, offsets
+
+
+def tessellate_geometries(arcs, circle_points=CIRCLE_POINTS):
+    # fills geom.points of every GeoArc with a view into one shared buffer
+    arcs = list(arcs)
+    if not arcs:
+        return None
+    vertices, offsets = tessellate_arcs([g.start for g in arcs],
+                                        [g.end for g in arcs],
+                                        [g.center for g in arcs],
+                                        [g.clockwise for g in arcs],
+                                        circle_points)
+    for geom, lo, hi in zip(arcs, offsets[:-1], offsets[1:]):
+        geom.points = vertices[lo:hi]
+    return vertices, offsets
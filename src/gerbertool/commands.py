@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import List, Tuple
+import numpy as np
 from apertures import ApertureDefinition
 from shapely.geometry import Polygon
 import copy
@@ -107,7 +108,9 @@ class ArcCommand(GerberCommand):
                  i_off,
                  j_off,
                  clockwise,
-                 aperture):
+                 aperture,
+                 start=None):
+        self.start = start
         self.end = end
         self.center_offset = (i_off, j_off)
         self.clockwise = clockwise
@@ -131,3 +134,23 @@ class ArcCommand(GerberCommand):
         ex, ey = self.end
         i2, j2 = self.center_offset
         return f"{code}X{ex:.6f}Y{ey:.6f}I{i2:.6f}J{j2:.6f}D01*"
+
+
+class StepRepeatCommand(GerberCommand):
+    def __init__(self, commands, nx, ny, step_x, step_y):
+        # the block is stored once; each repeat is only an offset
+        self.commands = list(commands)
+        self.repeat = (nx, ny)
+        self.step = (step_x, step_y)
+        ix, iy = np.meshgrid(np.arange(nx), np.arange(ny), indexing='ij')
+        self.offsets = np.column_stack([ix.ravel() * step_x, iy.ravel() * step_y])
+
+    def scale(self, sx, sy):
+        for cmd in self.commands:
+            cmd.scale(sx, sy)
+
+    def to_gerber(self):
+        nx, ny = self.repeat
+        i, j = self.step
+        body = "\n".join(cmd.to_gerber() for cmd in self.commands)
+        return f"%SRX{nx}Y{ny}I{i:.6f}J{j:.6f}*%\n{body}\n%SR*%"
@@ -0,0 +1,198 @@
+import os
+import re
+import numpy as np
+from apertures import ApertureDefinition
+from commands import DrawCommand
+from geometry import GeoDraw, GeoFlashBatch
+from sources import iter_text_chunks
+
+#Module for reading Excellon drill files into typed arrays
+
+# row kinds in DrillData.kind
+HIT, SLOT, ROUTE = range(3)
+
+DRILL_EXTENSIONS = ('.drl', '.xln', '.exc', '.drd', '.tap', '.nc')
+
+TOOL_DEF_RE = re.compile(r'^T0*(\d+)(?:[FSBH][\d.]+)*C([\d.]+)', re.M)
+HEADER_END_RE = re.compile(r'^(?:%|M95)[ \t\r]*$', re.M)
+# one statement per line: tool select, G code, coordinates, a G85 slot end and an M code;
+# arc words of routed G02/G03 moves are accepted and the move is taken as a chord
+STATEMENT_RE = re.compile(
+    r'^(?:T0*(\d+)(?:[FSBH][\d.]+)*(?:C[\d.]+)?)?'
+    r'(?:G0?([0-35]))?'
+    r'(?:X([-+]?[\d.]+))?(?:Y([-+]?[\d.]+))?'
+    r'(?:[AIJ][-+]?[\d.]+)*'
+    r'(?:(G85)(?:X([-+]?[\d.]+))?(?:Y([-+]?[\d.]+))?)?'
+    r'(?:M(\d+))?[ \t\r]*$',
+    re.M)
+
+
+def is_drill_name(name):
+    return os.fspath(name).lower().endswith(DRILL_EXTENSIONS)
+
+
+def _ffill(values, initial):
+    # carries the last present value forward, rows before the first one get initial
+    present = ~np.isnan(values)
+    idx = np.where(present, np.arange(len(values)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    out = values[np.maximum(idx, 0)]
+    out[idx < 0] = initial
+    return out
+
+
+class DrillData:
+    # every hit, slot and route move as one row: kind, tool and start/end in mm;
+    # hits have end == start
+    def __init__(self, tools, kind, tool, start, end):
+        self.tools = tools
+        self.kind = kind
+        self.tool = tool
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __repr__(self):
+        counts = np.bincount(self.kind, minlength=3)
+        return f"DrillData({len(self.tools)} tools, {counts[HIT]} hits, {counts[SLOT]} slots, {counts[ROUTE]} routes)"
+
+    def hits(self, tool=None):
+        mask = self.kind == HIT
+        if tool is not None:
+            mask &= self.tool == tool
+        return self.start[mask]
+
+    def geometries(self):
+        # one GeoFlashBatch per tool; slots and route chains become draws with the tool as pen
+        apertures = {t: ApertureDefinition(t, 'C', [d], 'mm') for t, d in self.tools.items()}
+        geometries = []
+        hit = self.kind == HIT
+        for t in np.unique(self.tool[hit]).tolist():
+            if t not in apertures:
+                raise ValueError(f"drill tool T{t} is used but not defined")
+            geometries.append(GeoFlashBatch(apertures[t], self.start[hit & (self.tool == t)]))
+
+        path = []
+        for k in np.flatnonzero(~hit).tolist():
+            t = int(self.tool[k])
+            if t not in apertures:
+                raise ValueError(f"drill tool T{t} is used but not defined")
+            start, end = tuple(self.start[k]), tuple(self.end[k])
+            # a route move continues the previous one when it starts where that one ended
+            if (self.kind[k] == ROUTE and path and path[-1][1] == t
+                    and self.kind[path[-1][2]] == ROUTE and path[-1][0][-1] == start):
+                path[-1][0].append(end)
+                path[-1] = (path[-1][0], t, k)
+            else:
+                path.append(([start, end], t, k))
+        geometries.extend(GeoDraw(DrawCommand(points, apertures[t])) for points, t, _ in path)
+        return geometries
+
+
+class ExcellonParser:
+    def __init__(self, filepath):
+        # same sources as GerberParser: a path, ArchiveMember, bytes or stream, gzip or not
+        self.filepath = filepath
+        self.units = 'mm'
+        self.zero_suppression = 'trailing'
+        self.int_digits = 3
+        self.frac_digits = 3
+        self.tools = {}
+
+    def run(self):
+        text = ''.join(iter_text_chunks(self.filepath))
+        body = self._parse_header(text)
+        return self._parse_body(body)
+
+    def _parse_header(self, text):
+        start = text.find('M48')
+        end = HEADER_END_RE.search(text, start if start >= 0 else 0)
+        header = text[start:end.start()] if start >= 0 and end else ''
+        body = text[end.end():] if start >= 0 and end else text
+
+        unit_match = re.search(r'^(METRIC|INCH)(?:,(LZ|TZ))?(?:,([0#]*)\.([0#]+))?', header, re.M)
+        if unit_match:
+            self.units = 'in' if unit_match[1] == 'INCH' else 'mm'
+            # LZ keeps leading zeros, so the trailing ones are the suppressed ones
+            if unit_match[2]:
+                self.zero_suppression = 'trailing' if unit_match[2] == 'LZ' else 'leading'
+        elif re.search(r'^M72', header, re.M):
+            self.units = 'in'
+        if self.units == 'in':
+            self.int_digits, self.frac_digits = 2, 4
+        if unit_match and unit_match[4]:
+            self.int_digits, self.frac_digits = len(unit_match[3]), len(unit_match[4])
+        file_format = re.search(r'FILE_FORMAT=(\d+):(\d+)', header)
+        if file_format:
+            self.int_digits, self.frac_digits = int(file_format[1]), int(file_format[2])
+
+        unit = 25.4 if self.units == 'in' else 1.0
+        # tools may also be defined inline in the body
+        for m in TOOL_DEF_RE.finditer(text):
+            self.tools[int(m[1])] = float(m[2]) * unit
+        return body
+
+    def _decode(self, col):
+        # coordinates with a decimal point are read as is, the others by the header format
+        values = np.full(len(col), np.nan)
+        present = col != ''
+        if not present.any():
+            return values
+        raw = col[present]
+        dotted = np.char.find(raw, '.') >= 0
+        out = np.empty(len(raw))
+        out[dotted] = raw[dotted].astype(float)
+        plain = raw[~dotted]
+        if len(plain):
+            neg = np.char.startswith(plain, '-')
+            plain = np.char.lstrip(plain, '+-')
+            if self.zero_suppression == 'trailing':
+                plain = np.char.ljust(plain, self.int_digits + self.frac_digits, '0')
+            ints = plain.astype(np.int64)
+            out[~dotted] = np.where(neg, -ints, ints) / 10 ** self.frac_digits
+        values[present] = out * (25.4 if self.units == 'in' else 1.0)
+        return values
+
+    def _parse_body(self, body):
+        rows = [row for row in STATEMENT_RE.findall(body) if any(row)]
+        if not rows:
+            empty = np.empty((0, 2))
+            return DrillData(self.tools, np.empty(0, np.int8), np.empty(0, np.int32), empty, empty)
+        table = np.array(rows, dtype=str)
+        tool_col, g_col, g85 = table[:, 0], table[:, 1], table[:, 4] != ''
+        m_col = table[:, 7]
+
+        x = self._decode(table[:, 2])
+        y = self._decode(table[:, 3])
+        has_xy = ~(np.isnan(x) & np.isnan(y))
+        x, y = _ffill(x, 0.0), _ffill(y, 0.0)
+        # the slot end inherits whatever axis it leaves out from the slot start
+        x2 = self._decode(table[:, 5])
+        y2 = self._decode(table[:, 6])
+        x2 = np.where(np.isnan(x2), x, x2)
+        y2 = np.where(np.isnan(y2), y, y2)
+
+        tool = np.where(tool_col != '', tool_col, 'nan').astype(float)
+        tool = _ffill(tool, 0).astype(np.int32)
+        # G05 (drill) is the default mode, G00 moves, G01-G03 cut while the tool is down
+        mode = np.where(g_col != '', g_col, 'nan').astype(float)
+        mode = _ffill(mode, 5).astype(np.int8)
+        down = np.full(len(rows), np.nan)
+        down[m_col == '15'] = 1
+        down[(m_col == '16') | (m_col == '17')] = 0
+        down = _ffill(down, 0).astype(bool)
+
+        hit = has_xy & (mode == 5) & ~g85
+        slot = has_xy & g85
+        route = has_xy & np.isin(mode, (1, 2, 3)) & down & ~g85
+        # a routed move starts at the position of the row before it
+        prev_x = np.concatenate([[0.0], x[:-1]])
+        prev_y = np.concatenate([[0.0], y[:-1]])
+
+        keep = hit | slot | route
+        kind = np.select([slot, route], [SLOT, ROUTE], HIT).astype(np.int8)[keep]
+        start = np.column_stack([np.where(route, prev_x, x), np.where(route, prev_y, y)])[keep]
+        end = np.column_stack([np.where(slot, x2, x), np.where(slot, y2, y)])[keep]
+        return DrillData(self.tools, kind, tool[keep], start, end)
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from exporter import DXFExporter, PdfRenderer
+from gerber_writer import GerberExporter
+from svg_writer import SVGExporter
+from interchange import write_npz
+
+#Module for running several exporters concurrently on one geometry snapshot
+
+
+def _freeze(geom):
+    for name in ('_points', 'stroke', '_offsets', 'center', '_centers'):
+        arr = getattr(geom, name, None)
+        if hasattr(arr, 'setflags'):
+            arr.setflags(write=False)
+    for inner in getattr(geom, 'geometries', ()):
+        _freeze(inner)
+    if getattr(geom, 'outline', None) is not None:
+        _freeze(geom.outline)
+    return geom
+
+
+class GeometrySnapshot:
+    # read-only copy of the scaled geometry that every exporter works from
+    def __init__(self, geometries, sx=1.0, sy=1.0, commands=(), apertures=None):
+        self.geometries = tuple(_freeze(geom.clone()) for geom in geometries)
+        self.sx, self.sy = float(sx), float(sy)
+        self.commands = tuple(commands)
+        self.apertures = dict(apertures or {})
+
+
+def export_dxf(snapshot, filename):
+    DXFExporter(snapshot.sx, snapshot.sy, filename, snapshot.commands,
+                geometries=snapshot.geometries).export()
+
+
+def export_pdf(snapshot, filename):
+    PdfRenderer(snapshot.geometries).export_scaled_geometry_to_pdf(filename)
+
+
+def export_gerber(snapshot, filename):
+    GerberExporter(snapshot.sx, snapshot.sy, filename, snapshot.commands, snapshot.apertures).export()
+
+
+def export_svg(snapshot, filename):
+    SVGExporter(snapshot.sx, snapshot.sy, filename, snapshot.commands,
+                geometries=snapshot.geometries).export()
+
+
+def export_npz(snapshot, filename):
+    write_npz(filename, snapshot.geometries, snapshot.sx, snapshot.sy)
+
+
+EXPORTERS = {
+    'dxf': export_dxf,
+    'pdf': export_pdf,
+    'gerber': export_gerber,
+    'svg': export_svg,
+    'npz': export_npz,
+}
+
+
+def register_exporter(fmt, func):
+    # func(snapshot, filename) must be a module-level function to run in a process pool
+    EXPORTERS[fmt] = func
+
+
+def _run_export(func, snapshot, filename):
+    filename = os.path.abspath(filename)
+    base, ext = os.path.splitext(os.path.basename(filename))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=f".{base}.", suffix=ext)
+    os.close(fd)
+    start = time.perf_counter()
+    try:
+        func(snapshot, tmp)
+        # readers never see a half written file
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return time.perf_counter() - start
+
+
+class ExportOrchestrator:
+    def __init__(self, snapshot, executor='process', max_workers=None, start_method=None):
+        self.snapshot = snapshot
+        self.executor = executor
+        self.max_workers = max_workers
+        # 'spawn' or 'forkserver' for callers with threads of their own, e.g. the GUI,
+        # where forking could copy a lock some other thread holds
+        self.start_method = start_method
+        self.timings = {}
+
+    def run(self, targets):
+        # targets maps a format name to its output file
+        unknown = [fmt for fmt in targets if fmt not in EXPORTERS]
+        if unknown:
+            raise ValueError(f"no exporter for: {', '.join(unknown)}")
+
+        workers = self.max_workers or len(targets) or 1
+        if self.executor == 'process':
+            context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+        start = time.perf_counter()
+        timings, errors = {}, {}
+        with pool:
+            futures = {fmt: pool.submit(_run_export, EXPORTERS[fmt], self.snapshot, path)
+                       for fmt, path in targets.items()}
+            for fmt, fut in futures.items():
+                try:
+                    timings[fmt] = fut.result()
+                except Exception as e:
+                    errors[fmt] = e
+        timings['total'] = time.perf_counter() - start
+        self.timings = timings
+        if errors:
+            raise RuntimeError("export failed: " + "; ".join(f"{fmt}: {e}" for fmt, e in errors.items()))
+        return timings
@@ -9,7 +9,8 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib.units import mm as rl_mm
 from reportlab.lib import colors
-from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc
+from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoInstanced, GeoFlashBatch, geometries_bbox
+from matplotlib.collections import PolyCollection
 from transformer import ScaleTransformer
 from reportlab.lib.pagesizes import A4
 import matplotlib.pyplot as plt
@@ -18,11 +19,16 @@ import matplotlib.pyplot as plt
 
 class DXFExporter:
     
-    def __init__(self, scale_x, scale_y, filename, commands):
+    def __init__(self, scale_x, scale_y, filename, commands, stroke=False, geometries=None, label=None):
         self.sx = float(scale_x)
         self.sy = float(scale_y)
         self.filename = filename
         self.commands = commands
+        self.stroke = stroke
+        # already scaled geometry, e.g. from an export snapshot, skips the transform
+        self.geometries = geometries
+        # text stamped below the layer, e.g. the scale factors of a sweep variant
+        self.label = label
 
     def export(self):
         
@@ -30,38 +36,217 @@ class DXFExporter:
         msp = doc.modelspace()
 
         
-        transformer = ScaleTransformer(self.sx, self.sy)
-        _, scaled_geoms, _ = transformer.apply(self.commands, {})
+        scaled_geoms = self.geometries
+        if scaled_geoms is None:
+            transformer = ScaleTransformer(self.sx, self.sy, stroke=self.stroke)
+            _, scaled_geoms, _ = transformer.apply(self.commands, {})
 
+        blocks = 0
+        flashes = 0
         for geom in scaled_geoms:
-            
-            if isinstance(geom, GeoAperture):
-                geo = geom
-            elif isinstance(geom, GeoDraw):
-                geo = geom
-            elif isinstance(geom, GeoRegion):
-                geo = geom
-            elif isinstance(geom, GeoArc):
-                geo = geom
-            else:
+            if isinstance(geom, GeoInstanced):
+                # step-and-repeat becomes one BLOCK with an INSERT per instance
+                block = doc.blocks.new(name=f"SR{blocks}")
+                blocks += 1
+                for inner in geom.geometries:
+                    self._add_geometry(block, inner)
+                for ox, oy in geom.offsets:
+                    msp.add_blockref(block.name, (float(ox), float(oy)))
                 continue
-
-            pts = geo.command_to_geometry()
-            if pts is None or len(pts) == 0:
+            if isinstance(geom, GeoFlashBatch):
+                # one BLOCK per aperture outline, one INSERT per flash
+                if geom.template is None or len(geom.template) == 0:
+                    continue
+                block = doc.blocks.new(name=f"FL{flashes}")
+                flashes += 1
+                self._add_geometry(block, geom.outline)
+                for cx, cy in geom.centers:
+                    msp.add_blockref(block.name, (float(cx), float(cy)))
                 continue
+            self._add_geometry(msp, geom)
 
-            
-            coords = [(float(x), float(y)) for x, y in pts]
-            
-            close = isinstance(geo, (GeoAperture, GeoRegion)) or np.allclose(pts[0], pts[-1])
-            msp.add_lwpolyline(coords, close=close)
+        box = geometries_bbox(scaled_geoms)
+        if self.label and box is not None:
+            msp.add_text(self.label, height=2.0).set_placement((float(box[0]), float(box[1]) - 4.0))
 
         doc.saveas(self.filename)
         print(f"DXF saved to {self.filename}")
 
+    def _add_geometry(self, layout, geo):
+        if not isinstance(geo, (GeoAperture, GeoDraw, GeoRegion, GeoArc)):
+            return
+        if getattr(geo, 'stroke', None) is not None:
+            for outline in geo.stroke:
+                layout.add_lwpolyline(outline.tolist(), close=True)
+            return
+        pts = geo.points
+        if pts is None or len(pts) == 0:
+            return
+
+        coords = [(float(x), float(y)) for x, y in pts]
+
+        close = isinstance(geo, (GeoAperture, GeoRegion)) or np.allclose(pts[0], pts[-1])
+        layout.add_lwpolyline(coords, close=close)
+
+
+
+
+
+
+class PdfRenderer:
+    # headless PDF writer, so the PDF can be produced without the preview window
+    def __init__(self, geoms, translate_x=0.0, translate_y=0.0, fiducial_offset_percent=80.0, label=None):
+        self.geoms = geoms
+        self.translate_x = translate_x
+        self.translate_y = translate_y
+        self.fiducial_offset_percent = fiducial_offset_percent
+        self.label = label
+
+    def render_geometry_to_canvas_reportlab(self, pdf_canvas_obj):
+        pdf_canvas_obj.saveState()
+
+        plot_margin_mm = 10.0
+
+        
+        box = geometries_bbox(self.geoms)
+        if box is None:
+            pdf_canvas_obj.restoreState()
+            return
+
+        min_x_geom, min_y_geom, max_x_geom, max_y_geom = box
+
+        
+        geom_w = (max_x_geom - min_x_geom) or 0.1
+        geom_h = (max_y_geom - min_y_geom) or 0.1
+
+        
+        tx_mm = plot_margin_mm - min_x_geom + self.translate_x
+        ty_mm = plot_margin_mm - min_y_geom + self.translate_y
+        pdf_canvas_obj.translate(tx_mm * rl_mm, ty_mm * rl_mm)
+        pdf_canvas_obj.scale(rl_mm, rl_mm)
+
+        
+        pad = 10.0
+        bg_x = min_x_geom - pad
+        bg_y = min_y_geom - pad
+        bg_w = geom_w + 2 * pad
+        bg_h = geom_h + 2 * pad
+        pdf_canvas_obj.setFillColor(colors.black)
+        pdf_canvas_obj.rect(bg_x, bg_y, bg_w, bg_h, fill=1)
+
+        
+        pdf_canvas_obj.setStrokeColor(colors.white)
+        pdf_canvas_obj.setFillColor(colors.white)
+        pdf_canvas_obj.setLineWidth(0.00025)
+
+        forms = 0
+        for geo in self.geoms:
+            if isinstance(geo, GeoInstanced):
+                # draw the block once as a form XObject and place it per instance
+                inner_box = geometries_bbox(geo.geometries)
+                if inner_box is None:
+                    continue
+                name = f"SR{forms}"
+                forms += 1
+                pdf_canvas_obj.beginForm(name, *(inner_box + np.array([-1, -1, 1, 1])))
+                pdf_canvas_obj.setStrokeColor(colors.white)
+                pdf_canvas_obj.setFillColor(colors.white)
+                pdf_canvas_obj.setLineWidth(0.00025)
+                for inner in geo.geometries:
+                    self._draw_geometry(pdf_canvas_obj, inner)
+                pdf_canvas_obj.endForm()
+                for ox, oy in geo.offsets:
+                    pdf_canvas_obj.saveState()
+                    pdf_canvas_obj.translate(float(ox), float(oy))
+                    pdf_canvas_obj.doForm(name)
+                    pdf_canvas_obj.restoreState()
+                continue
+            if isinstance(geo, GeoFlashBatch):
+                # the aperture outline is one form XObject placed at every flash
+                outline_box = geo.outline.bbox()
+                if outline_box is None:
+                    continue
+                name = f"FL{forms}"
+                forms += 1
+                pdf_canvas_obj.beginForm(name, *(outline_box + np.array([-1, -1, 1, 1])))
+                pdf_canvas_obj.setStrokeColor(colors.white)
+                pdf_canvas_obj.setFillColor(colors.white)
+                pdf_canvas_obj.setLineWidth(0.00025)
+                self._draw_points(pdf_canvas_obj, geo.template)
+                pdf_canvas_obj.endForm()
+                for cx, cy in geo.centers:
+                    pdf_canvas_obj.saveState()
+                    pdf_canvas_obj.translate(float(cx), float(cy))
+                    pdf_canvas_obj.doForm(name)
+                    pdf_canvas_obj.restoreState()
+                continue
+            self._draw_geometry(pdf_canvas_obj, geo)
+
+
+        fiducial_radius_mm = 1.0
+    
+        center_x_geom = min_x_geom + (geom_w / 2.0)
+        center_y_geom = min_y_geom + (geom_h / 2.0)
+
+        offset_x = (geom_w / 2.0) * (float(self.fiducial_offset_percent) / 100.0)
+        offset_y = (geom_h / 2.0) * (float(self.fiducial_offset_percent) / 100.0)
+
+        fiducial_positions = [
+        (center_x_geom - offset_x, center_y_geom - offset_y),
+        (center_x_geom + offset_x, center_y_geom - offset_y),
+        (center_x_geom + offset_x, center_y_geom + offset_y),
+        (center_x_geom - offset_x, center_y_geom + offset_y)
+        ]
+
+        pdf_canvas_obj.setFillColor(colors.white)
+        for fx, fy in fiducial_positions:
+            pdf_canvas_obj.circle(fx, fy, fiducial_radius_mm, fill=1, stroke=0)
+
+        if self.label:
+            # inside the black margin under the layer, 3 mm high
+            pdf_canvas_obj.setFont("Helvetica", 3)
+            pdf_canvas_obj.drawString(min_x_geom, min_y_geom - 6, self.label)
+
+        pdf_canvas_obj.restoreState()
+       
+    def _draw_geometry(self, pdf_canvas_obj, geo):
+        stroke = getattr(geo, 'stroke', None)
+        if stroke is None:
+            self._draw_points(pdf_canvas_obj, getattr(geo, 'points', None))
+            return
+        for outline in stroke:
+            path = pdf_canvas_obj.beginPath()
+            path.moveTo(outline[0, 0], outline[0, 1])
+            for x, y in outline[1:]:
+                path.lineTo(x, y)
+            path.close()
+            pdf_canvas_obj.drawPath(path, stroke=0, fill=1)
+
+    def _draw_points(self, pdf_canvas_obj, pts):
+        if pts is None or len(pts) == 0:
+            return
+
+        if pts.shape[0] > 1:
+            path = pdf_canvas_obj.beginPath()
+            path.moveTo(pts[0, 0], pts[0, 1])
+            for x, y in pts[1:]:
+                path.lineTo(x, y)
 
+            do_fill = False
+            if np.allclose(pts[0], pts[-1]) and pts.shape[0] > 2:
+                path.close()
+                do_fill = True
+            pdf_canvas_obj.drawPath(path, stroke=1, fill=do_fill)
 
+        else:
+            x, y = pts[0]
+            pdf_canvas_obj.circle(x, y, 0.1, fill=1, stroke=0)
 
+    def export_scaled_geometry_to_pdf(self, filename):
+        pdf_canvas_obj=canvas.Canvas(filename, pagesize=landscape(A4))
+        self.render_geometry_to_canvas_reportlab(pdf_canvas_obj)
+        pdf_canvas_obj.showPage()
+        pdf_canvas_obj.save()
 
 
 class Pdf_Exporter(tk.Toplevel):
@@ -132,19 +317,12 @@ class Pdf_Exporter(tk.Toplevel):
         self.ax.add_patch(a4)
 
         
-        all_pts = []
-        for geom in self.geoms:
-            pts = getattr(geom, 'points', None)
-            if pts is None or len(pts)==0:
-                continue
-            all_pts.append(pts)
-        if not all_pts:
+        box = geometries_bbox(self.geoms)
+        if box is None:
             self.canvas.draw_idle()
             return
 
-        combined = np.vstack(all_pts)
-        min_x, min_y = combined.min(axis=0)
-        max_x, max_y = combined.max(axis=0)
+        min_x, min_y, max_x, max_y = box
         geom_w = max_x - min_x
         geom_h = max_y - min_y
 
@@ -163,6 +341,26 @@ class Pdf_Exporter(tk.Toplevel):
 
         
         for geom in self.geoms:
+            if isinstance(geom, GeoInstanced):
+                for inner in geom.geometries:
+                    if inner.points is None or len(inner.points) == 0:
+                        continue
+                    copies = geom.instances(inner) * pdf_scale + np.array([tx, ty])
+                    self.ax.add_collection(PolyCollection(copies, closed=True, facecolor='black',
+                                                          edgecolor='black', linewidth=1))
+                continue
+
+            if isinstance(geom, GeoFlashBatch):
+                if geom.template is not None and len(geom.template):
+                    self.ax.add_collection(PolyCollection(geom.flashes() * pdf_scale + np.array([tx, ty]),
+                                                          closed=True, facecolor='black', edgecolor='black', linewidth=1))
+                continue
+
+            if getattr(geom, 'stroke', None) is not None:
+                self.ax.add_collection(PolyCollection(geom.stroke * pdf_scale + np.array([tx, ty]),
+                                                      closed=True, facecolor='black', edgecolor='black', linewidth=1))
+                continue
+
             pts = getattr(geom, 'points', None)
             if pts is None or len(pts)==0:
                 continue
@@ -190,104 +388,17 @@ class Pdf_Exporter(tk.Toplevel):
     def _initial_preview(self):  
         self._update_preview()   
   
-    def render_geometry_to_canvas_reportlab(self, pdf_canvas_obj):
-        pdf_canvas_obj.saveState()
-
-        plot_margin_mm = 10.0
-
-        
-        all_pts = []
-        for geo in self.geoms:
-            pts = getattr(geo, 'points', None)
-            if pts is None or len(pts) == 0:
-                continue
-            all_pts.append(pts)
-        if not all_pts:
-            pdf_canvas_obj.restoreState()
-            return
-
-        combined = np.vstack(all_pts)
-        min_x_geom, min_y_geom = combined.min(axis=0)
-        max_x_geom, max_y_geom = combined.max(axis=0)
-
-        
-        geom_w = (max_x_geom - min_x_geom) or 0.1
-        geom_h = (max_y_geom - min_y_geom) or 0.1
+    def _renderer(self):
+        return PdfRenderer(self.geoms,
+                           self.translate_x_offset_mm.get(),
+                           self.translate_y_offset_mm.get(),
+                           self.fiducial_offset_percent.get())
 
-        
-        tx_mm = plot_margin_mm - min_x_geom + self.translate_x_offset_mm.get()
-        ty_mm = plot_margin_mm - min_y_geom + self.translate_y_offset_mm.get()
-        pdf_canvas_obj.translate(tx_mm * rl_mm, ty_mm * rl_mm)
-        pdf_canvas_obj.scale(rl_mm, rl_mm)
-
-        
-        pad = 10.0
-        bg_x = min_x_geom - pad
-        bg_y = min_y_geom - pad
-        bg_w = geom_w + 2 * pad
-        bg_h = geom_h + 2 * pad
-        pdf_canvas_obj.setFillColor(colors.black)
-        pdf_canvas_obj.rect(bg_x, bg_y, bg_w, bg_h, fill=1)
-
-        
-        pdf_canvas_obj.setStrokeColor(colors.white)
-        pdf_canvas_obj.setFillColor(colors.white)
-        pdf_canvas_obj.setLineWidth(0.00025)
-
-        for geo in self.geoms:
-            pts = getattr(geo, 'points', None)
-            if pts is None or len(pts) == 0:
-                continue
-
-            if pts.shape[0] > 1:
-                path = pdf_canvas_obj.beginPath()
-                path.moveTo(pts[0, 0], pts[0, 1])
-                for x, y in pts[1:]:
-                    path.lineTo(x, y)
-
-                do_fill = False
-                if np.allclose(pts[0], pts[-1]) and pts.shape[0] > 2:
-                    path.close()
-                    do_fill = True
-                pdf_canvas_obj.drawPath(path, stroke=1, fill=do_fill)
-
-            else:
-                x, y = pts[0]
-                pdf_canvas_obj.circle(x, y, 0.1, fill=1, stroke=0)
-
-
-        fiducial_radius_mm = 1.0
-    
-        center_x_geom = min_x_geom + (geom_w / 2.0)
-        center_y_geom = min_y_geom + (geom_h / 2.0)
-
-        offset_x = (geom_w / 2.0) * (float(self.fiducial_offset_percent.get()) / 100.0)
-        offset_y = (geom_h / 2.0) * (float(self.fiducial_offset_percent.get()) / 100.0)
-
-        fiducial_positions = [
-        (center_x_geom - offset_x, center_y_geom - offset_y),
-        (center_x_geom + offset_x, center_y_geom - offset_y),
-        (center_x_geom + offset_x, center_y_geom + offset_y),
-        (center_x_geom - offset_x, center_y_geom + offset_y)
-        ]
-
-        pdf_canvas_obj.setFillColor(colors.white)
-        for fx, fy in fiducial_positions:
-            pdf_canvas_obj.circle(fx, fy, fiducial_radius_mm, fill=1, stroke=0)
+    def render_geometry_to_canvas_reportlab(self, pdf_canvas_obj):
+        self._renderer().render_geometry_to_canvas_reportlab(pdf_canvas_obj)
 
-        pdf_canvas_obj.restoreState()
-       
     def export_scaled_geometry_to_pdf(self, filename):  
-        pdf_canvas_obj=canvas.Canvas(filename, pagesize=landscape(A4))  
-
-        self.render_geometry_to_canvas_reportlab(pdf_canvas_obj)  
-
-
-        try:  
-            pdf_canvas_obj.showPage()  
-            pdf_canvas_obj.save()  
-        except Exception as e:  
-            print(f"Error exporting PDF file {e}")  
+        self._renderer().export_scaled_geometry_to_pdf(filename)
 
     def _export_final_pdf(self):  
         filename=filedialog.asksaveasfilename(  
@@ -0,0 +1,21 @@
+import numpy as np
+
+#Module for quantising coordinates to an integer grid
+
+# grid step in mm; gerber coordinates with up to 6 decimals in mm land exactly on it
+NANOMETRE = 1e-6
+
+
+def to_fixed(values, resolution=NANOMETRE, dtype=np.int64):
+    # float mm -> integer grid units; int32 is refused when the values do not fit
+    scaled = np.rint(np.asarray(values, dtype=np.float64) / resolution)
+    info = np.iinfo(dtype)
+    if scaled.size and (scaled.min() < info.min or scaled.max() > info.max):
+        raise OverflowError(f"coordinates do not fit {np.dtype(dtype).name} at resolution {resolution} mm")
+    return scaled.astype(dtype)
+
+
+def to_float(values, resolution=NANOMETRE, dtype=np.float64):
+    # integer grid units -> float mm; float32 is enough for plotting buffers
+    values = np.asarray(values)
+    return values.astype(dtype) * dtype(resolution)
@@ -4,13 +4,72 @@ from abc import ABC, abstractmethod
 from shapely.geometry import Point, LineString, Polygon, box
 from gerbonara.graphic_primitives import Circle, ArcPoly, Line, Arc,Rectangle
 import math
+import weakref
+from metrics import polygon_centroid
+from offset import offset_contour
+from arcs import tessellate_geometries
+from commands import FlashCommand
+from fixed import to_fixed, to_float
+
+
+class FixedArray:
+    # float mm coordinates that are quantised to the owner's grid once set_resolution()
+    # has run; every read converts to a new read-only float64 array, so an in-place
+    # write fails loudly instead of landing in a temporary
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        values = getattr(obj, self.name, None)
+        if values is None or obj.resolution is None:
+            return values
+        values = to_float(values, obj.resolution)
+        values.flags.writeable = False
+        return values
+
+    def __set__(self, obj, value):
+        if value is not None and obj.resolution is not None:
+            value = to_fixed(value, obj.resolution, obj.coord_dtype)
+        setattr(obj, self.name, value)
 
 
 class Geometry(ABC):
+    # points are float mm; after set_resolution() they are quantised to that grid, so
+    # scaled and offset coordinates snap back onto it and compare exactly. This is for
+    # exact coordinates, not for saving memory: reads still give float64
+    resolution = None
+    coord_dtype = np.int64
+    _points = None
+    points = FixedArray()
+    # every FixedArray attribute, moved onto the grid together by set_resolution()
+    fixed_fields = ('points',)
+
     def __init__(self):
         
         self.points: np.ndarray = np.empty((0, 2))
 
+    def set_resolution(self, resolution, dtype=np.int64):
+        values = {name: getattr(self, name) for name in self.fixed_fields}
+        self.resolution = resolution
+        self.coord_dtype = dtype
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def points_as(self, dtype=np.float32):
+        # render buffer in the requested float type
+        pts = self._points
+        if pts is None or self.resolution is None:
+            return None if pts is None else np.asarray(pts, dtype=dtype)
+        return to_float(pts, self.resolution, dtype)
+
+    def same_points(self, other):
+        # exact comparison on the integer grid when both sides use the same one
+        if self.resolution is not None and self.resolution == other.resolution:
+            return np.array_equal(self._points, other._points)
+        return np.array_equal(self.points, other.points)
+
     def __iter__(self):
         return iter(self.points)
     def clone(self):
@@ -25,6 +84,17 @@ class Geometry(ABC):
     def find_center(self):
         pass
 
+    def bbox(self):
+        if self._points is None or len(self._points) == 0:
+            return None
+        stroke = getattr(self, 'stroke', None)
+        if stroke is None and self.resolution is not None:
+            # integer min/max, one conversion for the four numbers
+            lo, hi = self._points.min(axis=0), self._points.max(axis=0)
+            return to_float(np.concatenate([lo, hi]), self.resolution)
+        pts = np.asarray(self.points if stroke is None else stroke).reshape(-1, 2)
+        return np.concatenate([pts.min(axis=0), pts.max(axis=0)])
+
     def findPerpendicular(self, points, i, eps= 1e-8):
         pts = np.asarray(points)
         N = len(pts)
@@ -75,7 +145,78 @@ class Geometry(ABC):
 
         self.points = new_pts
 
+    def offset_geometry(self, scale_x, scale_y, join='miter', miter_limit=2.0):
+        # same growth as scale_geometry, with every vertex moved in one array pass
+        if not self.closed or self.points is None or len(self.points) < 3:
+            return
+        self.points = offset_contour(self.points, scale_x-1, scale_y-1, join, miter_limit)
+
+
+# tessellated macro outlines at the origin, keyed by (macro name, params, unit)
+_macro_outlines = {}
+# tessellated standard apertures at the origin, keyed by the shared aperture instance
+_aperture_templates = weakref.WeakKeyDictionary()
+
+
+def _tessellate_primitives(shapes):
+    all_pts = []
+    for prim in shapes:
+        if isinstance(prim, Circle):
+            theta = np.linspace(0, 2*math.pi, 64, endpoint=False)
+            x = prim.x + prim.r * np.cos(theta)
+            y = prim.y + prim.r * np.sin(theta)
+            coords = np.column_stack([x, y])
+
+        elif isinstance(prim, ArcPoly):
+            coords = np.array(prim.outline)
+
+        elif isinstance(prim, Line):
+            coords = np.array([[prim.x1, prim.y1],
+                               [prim.x2, prim.y2]])
+
+        elif isinstance(prim, Arc):
+            cx = prim.x1 + prim.cx
+            cy = prim.y1 + prim.cy
+            r  = math.hypot(prim.x1 - cx, prim.y1 - cy)
+            a1 = math.atan2(prim.y1 - cy, prim.x1 - cx)
+            a2 = math.atan2(prim.y2 - cy, prim.x2 - cx)
+            if prim.clockwise:
+                if a2 > a1: a2 -= 2*math.pi
+            else:
+                if a2 < a1: a2 += 2*math.pi
+            angles = np.linspace(a1, a2, 32)
+            coords = np.column_stack([cx + r * np.cos(angles), cy + r * np.sin(angles)])
+
+        elif isinstance(prim, Rectangle):
+            coords = np.array(prim.to_arc_poly().outline)
+
+        else:
+            continue
+
+        all_pts.append(coords)
+    if not all_pts:
+        return np.zeros((1, 2))
+    return np.vstack(all_pts)
+
+
+def expand_macro(ap, unit='mm'):
+    # scaled macro apertures carry scaled params, so they get their own entry
+    key = (ap.macro.name, tuple(ap.params), unit)
+    hit = _macro_outlines.get(key)
+    # same name with a different body (another file) is a different macro
+    if hit is not None and (hit[0] is ap.macro or hit[0] == ap.macro):
+        return hit[1]
+    shapes = ap.macro.to_graphic_primitives(offset=(0, 0), rotation=0, parameters=ap.params,
+                                            unit=unit, polarity_dark=True)
+    outline = _tessellate_primitives(shapes)
+    outline.setflags(write=False)
+    _macro_outlines[key] = (ap.macro, outline)
+    return outline
+
+
 class GeoAperture(Geometry):
+    closed = True
+
     def __init__(self, cmd):
 
         self.cmd = cmd
@@ -86,78 +227,24 @@ class GeoAperture(Geometry):
 
     def command_to_geometry(self):
         
-        u = np.array([1.0, 0.0])  
-        v = np.array([0.0, 1.0])
         num_pts = 128
         ap = self.cmd.aperture
         if ap.shape == 'MACRO':
-      
-            
-            shapes = ap.macro.to_graphic_primitives(
-                offset=(self.cmd.x,self.cmd.y),
-                rotation=0,
-                parameters=ap.params,
-                unit='mm',
-                polarity_dark=True
-            )
-            all_pts = []
-            for prim in shapes:
-                
-     
-                if isinstance(prim, Circle):
-         
-                    theta = np.linspace(0, 2*math.pi, 64, endpoint=False)
-                    x = prim.x + prim.r * np.cos(theta)
-                    y = prim.y + prim.r * np.sin(theta)
-                    coords = np.column_stack([x, y])
-
-                
-                elif isinstance(prim, ArcPoly):
-                    coords = np.array(prim.outline)
-
-                
-                elif isinstance(prim, Line):
-   
-                    coords = np.array([[prim.x1, prim.y1],
-                                       [prim.x2, prim.y2]])
-
-                
-                elif isinstance(prim, Arc):
-
-                    cx = prim.x1 + prim.cx
-                    cy = prim.y1 + prim.cy
-                    r  = math.hypot(prim.x1 - cx, prim.y1 - cy)
-                    a1 = math.atan2(prim.y1 - cy, prim.x1 - cx)
-                    a2 = math.atan2(prim.y2 - cy, prim.x2 - cx)
-                    
-                    if prim.clockwise:
-                        if a2 > a1: a2 -= 2*math.pi
-                        angles = np.linspace(a1, a2, 32)
-                    else:
-                        if a2 < a1: a2 += 2*math.pi
-                        angles = np.linspace(a1, a2, 32)
-                    x = cx + r * np.cos(angles)
-                    y = cy + r * np.sin(angles)
-                    coords = np.column_stack([x, y])
-
-                
-                elif isinstance(prim, Rectangle):
-
-                    poly = prim.to_arc_poly()
-                    coords = np.array(poly.outline)
-
-                else:
-                
-                    continue
-
-                all_pts.append(coords)
-
-            
-            self.points=np.vstack(all_pts)
-            return np.vstack(all_pts)
-
-
+            self.points = expand_macro(ap) + self.center
+            return self.points
+
+        # apertures are shared per D-code, so each shape is tessellated once
+        template = _aperture_templates.get(ap)
+        if template is None:
+            template = self._template(num_pts)
+            template.setflags(write=False)
+            _aperture_templates[ap] = template
+        self.points = template + self.center
+        return self.points
 
+    def _template(self, num_pts):
+        u = np.array([1.0, 0.0])  
+        v = np.array([0.0, 1.0])
         if self.shape == 'C':
                   
             r = self.params[0] / 2
@@ -277,13 +364,14 @@ class GeoAperture(Geometry):
             pts = np.zeros((1,2))
 
         
-        self.points = pts.dot(np.stack([u,v]).T) + self.center
-        return self.points
+        return pts.dot(np.stack([u,v]).T)
 
     def find_center(self):
         return self.center
    
 class GeoRegion(Geometry):
+    closed = True
+
     def __init__(self, cmd):
         
         self.points = np.array(cmd.polygon)
@@ -294,60 +382,163 @@ class GeoRegion(Geometry):
 
     def find_center(self):
         
-        poly = Polygon(self.points)
-        cx, cy = poly.centroid.x, poly.centroid.y
-        self.center = np.array([cx, cy])
+        self.center = polygon_centroid(self.points)
         return self.center
    
 class GeoDraw(Geometry):
+    closed = False
+
     def __init__(self, cmd):
         
         self.points = np.array(cmd.path)
         self.center = None
+        self.aperture = cmd.aperture
+        self.stroke = None
 
     def command_to_geometry(self):
         return self.points
 
+    def scale_geometry(self, scale_x, scale_y):
+        # a trace is an open centerline, its width comes from the aperture
+        return
+
     def find_center(self):
         
         x,y = self.points.T
-        L = np.hypot(np.diff(x), np.diff(y))
-        if L.sum() == 0:
+        L = np.cumsum(np.hypot(np.diff(x), np.diff(y)))
+        if len(L) == 0 or L[-1] == 0:
             return self.points.mean(axis=0)
-        mid = np.cumsum(L) - L/2
-        idx = np.searchsorted(np.cumsum(L), L.sum()/2)
+        idx = np.searchsorted(L, L[-1]/2)
         self.center = self.points[idx]
         return self.center
 
 class GeoArc(Geometry):
-    def __init__(self, cmd, last_point):
-        
-        self.start = np.array(last_point)
-        self.end   = np.array(cmd.end)
-        self.off   = np.array(cmd.center_offset)
+    closed = False
+
+    def __init__(self, cmd, last_point=None):
+        # the parser records where each arc starts; last_point overrides it
+        if last_point is None:
+            last_point = cmd.start if cmd.start is not None else cmd.end
+        self.start = np.array(last_point, dtype=float)
+        self.end   = np.array(cmd.end, dtype=float)
+        self.off   = np.array(cmd.center_offset, dtype=float)
         self.clockwise = cmd.clockwise
         self.center = self.start + self.off
         self.points = None
+        self.aperture = cmd.aperture
+        self.stroke = None
 
     def command_to_geometry(self):
-        r = np.linalg.norm(self.off)
-        v0 = self.start - self.center
-        v1 = self.end   - self.center
-        e0 = np.arctan2(v0[1], v0[0])
-        e1 = np.arctan2(v1[1], v1[0])
-        
-        if self.clockwise:
-            if e1 > e0:
-                e1 -= 2*np.pi
-        else:
-            if e1 < e0:
-                e1 += 2*np.pi
-        thetas = np.linspace(e0, e1, 64)
-        self.points = np.stack([
-            self.center[0] + r*np.cos(thetas),
-            self.center[1] + r*np.sin(thetas)
-        ], axis=1)
+        tessellate_geometries([self])
         return self.points
 
+    def scale_geometry(self, scale_x, scale_y):
+        # like a trace, an arc is an open centerline and its width comes from the aperture
+        return
+
     def find_center(self):
         return self.center
+
+
+class GeoInstanced(Geometry):
+    offsets = FixedArray()
+    fixed_fields = ('points', 'offsets')
+
+    def __init__(self, geometries, offsets):
+        # one copy of the block geometry plus an (N, 2) array of instance offsets
+        self.geometries = list(geometries)
+        self.offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)
+        self.points = None
+        self.center = None
+
+    def command_to_geometry(self):
+        for geom in self.geometries:
+            if geom.points is None:
+                geom.command_to_geometry()
+        return None
+
+    def instances(self, geom):
+        return np.asarray(geom.points)[None, :, :] + self.offsets[:, None, :]
+
+    def scale_geometry(self, scale_x, scale_y):
+        for geom in self.geometries:
+            geom.scale_geometry(scale_x, scale_y)
+
+    def offset_geometry(self, scale_x, scale_y, join='miter', miter_limit=2.0):
+        for geom in self.geometries:
+            geom.offset_geometry(scale_x, scale_y, join, miter_limit)
+
+    def set_resolution(self, resolution, dtype=np.int64):
+        super().set_resolution(resolution, dtype)
+        for geom in self.geometries:
+            geom.set_resolution(resolution, dtype)
+
+    def bbox(self):
+        inner = geometries_bbox(self.geometries)
+        if inner is None or len(self.offsets) == 0:
+            return None
+        lo = self.offsets.min(axis=0)
+        hi = self.offsets.max(axis=0)
+        return np.concatenate([inner[:2] + lo, inner[2:] + hi])
+
+    def find_center(self):
+        box = self.bbox()
+        self.center = None if box is None else (box[:2] + box[2:]) / 2
+        return self.center
+
+
+class GeoFlashBatch(Geometry):
+    closed = True
+    centers = FixedArray()
+    fixed_fields = ('points', 'centers')
+
+    def __init__(self, aperture, centers):
+        # every flash of one aperture: a single outline at the origin and an (N, 2) array
+        # of centers; scaling only touches the outline
+        self.aperture = aperture
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        self.outline = GeoAperture(FlashCommand(0.0, 0.0, aperture))
+        self.points = None
+        self.center = None
+
+    @property
+    def template(self):
+        return self.outline.points
+
+    def command_to_geometry(self):
+        self.outline.command_to_geometry()
+        return None
+
+    def flashes(self):
+        # (N, K, 2) outlines, only materialized when a consumer asks for them
+        return np.asarray(self.template)[None, :, :] + self.centers[:, None, :]
+
+    def scale_geometry(self, scale_x, scale_y):
+        self.outline.scale_geometry(scale_x, scale_y)
+
+    def offset_geometry(self, scale_x, scale_y, join='miter', miter_limit=2.0):
+        self.outline.offset_geometry(scale_x, scale_y, join, miter_limit)
+
+    def set_resolution(self, resolution, dtype=np.int64):
+        super().set_resolution(resolution, dtype)
+        self.outline.set_resolution(resolution, dtype)
+
+    def bbox(self):
+        if self.template is None or len(self.template) == 0 or len(self.centers) == 0:
+            return None
+        pts = np.asarray(self.template)
+        return np.concatenate([pts.min(axis=0) + self.centers.min(axis=0),
+                               pts.max(axis=0) + self.centers.max(axis=0)])
+
+    def find_center(self):
+        box = self.bbox()
+        self.center = None if box is None else (box[:2] + box[2:]) / 2
+        return self.center
+
+
+def geometries_bbox(geometries):
+    boxes = [b for b in (g.bbox() for g in geometries) if b is not None]
+    if not boxes:
+        return None
+    boxes = np.array(boxes)
+    return np.concatenate([boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)])
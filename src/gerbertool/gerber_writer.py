@@ -0,0 +1,227 @@
+import numpy as np
+from gerbonara.cam import FileSettings
+from gerbonara.utils import MM
+from commands import FlashCommand, DrawCommand, RegionCommand, ArcCommand, StepRepeatCommand
+from geometry import GeoArc
+from offset import offset_contour
+from stroke import pen_outline, path_segments, stroke_segments
+
+#Module for writing scaled gerber files
+
+
+def _format_param(value):
+    text = f"{value:.6f}".rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+
+class GerberExporter:
+
+    def __init__(self, scale_x, scale_y, filename, commands, apertures=None,
+                 int_digits=4, frac_digits=6, batch_size=65536, buffer_size=1 << 20):
+        self.sx = float(scale_x)
+        self.sy = float(scale_y)
+        self.filename = filename
+        self.commands = commands
+        self.apertures = apertures
+        self.int_digits = int_digits
+        self.frac_digits = frac_digits
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+
+    def export(self):
+        apertures = self.apertures or self._collect_apertures(self.commands, {})
+        scaled = {code: ap.scale(self.sx, self.sy) for code, ap in apertures.items()}
+        # the parser hands out the same aperture object for every use of a D-code
+        self._codes = {id(ap): code for code, ap in apertures.items()}
+        with open(self.filename, 'w', buffering=self.buffer_size, newline='\n') as f:
+            self._write_header(f, scaled)
+            self._write_body(f)
+            f.write("M02*\n")
+        print(f"Gerber saved to {self.filename}")
+
+    def export_stream(self, command_chunks):
+        # apertures are declared just before their first use, so chunks can come
+        # straight from GerberParser.iter_commands without a full command list
+        self._codes = {}
+        self._declared = set()
+        self._macros = set()
+        with open(self.filename, 'w', buffering=self.buffer_size, newline='\n') as f:
+            self._write_preamble(f)
+            self._templates = []
+            self._coords = []
+            self._current = None
+            for cmds in command_chunks:
+                self._emit_commands(f, cmds)
+                self._flush(f)
+            f.write("M02*\n")
+        self._declared = None
+        print(f"Gerber saved to {self.filename}")
+
+    def _collect_apertures(self, cmds, found):
+        for cmd in cmds:
+            if isinstance(cmd, StepRepeatCommand):
+                self._collect_apertures(cmd.commands, found)
+            elif getattr(cmd, 'aperture', None) is not None:
+                found.setdefault(cmd.aperture.code, cmd.aperture)
+        return found
+
+    def _write_header(self, f, scaled):
+        self._write_preamble(f)
+
+        macros = {}
+        for ap in scaled.values():
+            if ap.shape == 'MACRO':
+                macros.setdefault(ap.macro.name, ap.macro)
+        for macro in macros.values():
+            self._write_macro(f, macro)
+
+        for code in sorted(scaled):
+            self._write_aperture(f, code, scaled[code])
+
+    def _write_preamble(self, f):
+        i, d = self.int_digits, self.frac_digits
+        f.write(f"G04 Scaled by gerbertool X{_format_param(self.sx)} Y{_format_param(self.sy)}*\n")
+        f.write(f"%FSLAX{i}{d}Y{i}{d}*%\n%MOMM*%\n%LPD*%\nG75*\nG01*\n")
+
+    def _write_macro(self, f, macro):
+        f.write(f"%AM{macro.name}*\n{macro.to_gerber(FileSettings(unit=MM))}*%\n")
+
+    def _write_aperture(self, f, code, ap):
+        params = list(ap.params)
+        if ap.shape == 'MACRO':
+            name = ap.macro.name
+            # gerbonara writes inch macros with $n x 25.4, the parser already converted params to mm
+            if ap.macro.primitives and ap.macro.primitives[0].unit != MM:
+                params = [p / 25.4 for p in params]
+        else:
+            name = ap.shape
+        if ap.shape == 'P' and len(params) > 1:
+            params[1] = round(params[1])
+        tail = ',' + 'X'.join(_format_param(p) for p in params) if params else ''
+        f.write(f"%ADD{code}{name}{tail}*%\n")
+
+    def _write_body(self, f):
+        self._templates = []
+        self._coords = []
+        self._current = None
+        self._emit_commands(f, self.commands)
+        self._flush(f)
+
+    def _emit(self, f, template, *coords):
+        self._templates.append(template)
+        self._coords.extend(coords)
+        if len(self._templates) >= self.batch_size:
+            self._flush(f)
+
+    def _flush(self, f):
+        if not self._templates:
+            return
+        # quantise the whole batch at once and let %-formatting fill the fixed-point integers
+        scale = 10 ** self.frac_digits
+        ints = np.rint(np.asarray(self._coords, dtype=float) * scale).astype(np.int64).tolist()
+        f.write('\n'.join(self._templates) % tuple(ints))
+        f.write('\n')
+        self._templates = []
+        self._coords = []
+
+    def _select(self, f, aperture):
+        code = self._codes.get(id(aperture), aperture.code)
+        if getattr(self, '_declared', None) is not None and code not in self._declared:
+            self._declare(f, code, aperture)
+        if code != self._current:
+            self._emit(f, f"D{code}*")
+            self._current = code
+
+    def _declare(self, f, code, aperture):
+        # definitions go out unformatted, so the pending batch is written first
+        self._flush(f)
+        scaled = aperture.scale(self.sx, self.sy)
+        if scaled.shape == 'MACRO' and scaled.macro.name not in self._macros:
+            self._write_macro(f, scaled.macro)
+            self._macros.add(scaled.macro.name)
+        self._write_aperture(f, code, scaled)
+        self._declared.add(code)
+
+    def _emit_commands(self, f, cmds):
+        for cmd in cmds:
+            if isinstance(cmd, FlashCommand):
+                self._select(f, cmd.aperture)
+                self._emit(f, "X%dY%dD03*", cmd.x, cmd.y)
+
+            elif isinstance(cmd, (DrawCommand, ArcCommand)) and self._as_regions(cmd.aperture):
+                self._emit_stroked(f, cmd)
+
+            elif isinstance(cmd, DrawCommand):
+                if not cmd.path:
+                    continue
+                self._select(f, cmd.aperture)
+                path = cmd.path
+                if cmd.mode == 'move':
+                    for x, y in path:
+                        self._emit(f, "X%dY%dD02*", x, y)
+                    continue
+                if len(path) > 1:
+                    self._emit(f, "X%dY%dD02*", *path[0])
+                    path = path[1:]
+                for x, y in path:
+                    self._emit(f, "X%dY%dD01*", x, y)
+
+            elif isinstance(cmd, ArcCommand):
+                self._select(f, cmd.aperture)
+                code = "G02" if cmd.clockwise else "G03"
+                if cmd.start is not None:
+                    self._emit(f, "X%dY%dD02*", *cmd.start)
+                self._emit(f, code + "X%dY%dI%dJ%dD01*", *cmd.end, *cmd.center_offset)
+                self._emit(f, "G01*")
+
+            elif isinstance(cmd, RegionCommand):
+                pts = self._scaled_region(cmd)
+                if pts is None or len(pts) < 3:
+                    continue
+                self._emit_region(f, pts)
+
+            elif isinstance(cmd, StepRepeatCommand):
+                nx, ny = cmd.repeat
+                i, j = cmd.step
+                self._emit(f, f"%%SRX{nx}Y{ny}I{_format_param(i)}J{_format_param(j)}*%%")
+                self._emit_commands(f, cmd.commands)
+                self._emit(f, "%%SR*%%")
+
+    def _emit_region(self, f, pts):
+        self._emit(f, "G36*")
+        self._emit(f, "X%dY%dD02*", *pts[0])
+        for x, y in pts[1:]:
+            self._emit(f, "X%dY%dD01*", x, y)
+        self._emit(f, "G37*")
+
+    def _as_regions(self, aperture):
+        # interpolation needs a circular aperture; a circle scaled by unequal factors
+        # is an ellipse, so those traces, and any drawn with another shape, go out as
+        # the regions their stroke covers
+        return aperture is not None and aperture.scale(self.sx, self.sy).shape != 'C'
+
+    def _emit_stroked(self, f, cmd):
+        if isinstance(cmd, DrawCommand):
+            if cmd.mode == 'move' or not cmd.path:
+                return
+            pts = cmd.path
+        else:
+            arc = GeoArc(cmd)
+            pts = arc.command_to_geometry()
+        pen = pen_outline(cmd.aperture.scale(self.sx, self.sy))
+        # one convex outline per segment; overlapping dark regions simply merge
+        for outline in stroke_segments(path_segments(pts), pen):
+            self._emit_region(f, np.vstack([outline, outline[:1]]))
+
+    def _scaled_region(self, cmd):
+        # same growth and condition as ScaleTransformer.scale with method='offset',
+        # which is also how the aperture sizes above are grown
+        pts = np.asarray(cmd.polygon, dtype=float).reshape(-1, 2)
+        if len(pts) < 3:
+            return pts
+        if self.sx != 1 and self.sy != 1:
+            pts = offset_contour(pts, self.sx - 1, self.sy - 1)
+        # a gerber contour must end on its start point
+        if not np.array_equal(pts[0], pts[-1]):
+            pts = np.vstack([pts, pts[:1]])
+        return pts
@@ -0,0 +1,160 @@
+import struct
+import zipfile
+import numpy as np
+from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoInstanced, GeoFlashBatch
+
+#Module for exchanging scaled geometry as packed arrays that other tools map without parsing
+
+FORMAT_VERSION = 1
+# row kinds
+FLASH, DRAW, ARC, REGION = range(4)
+KINDS = {GeoAperture: FLASH, GeoFlashBatch: FLASH, GeoDraw: DRAW, GeoArc: ARC, GeoRegion: REGION}
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+def _aperture(geom):
+    if isinstance(geom, GeoAperture):
+        return geom.cmd.aperture
+    return getattr(geom, 'aperture', None)
+
+
+class _Packer:
+    # vertex ranges are stored once and shared by every row that places them, so all
+    # flashes of an aperture and all copies of a step-and-repeat block point at one range
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.rows = []
+        self.apertures = {}
+
+    def add(self, geom, origins):
+        pts = geom.points
+        if pts is None or len(pts) == 0 or len(origins) == 0:
+            return
+        pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+        start = self.size
+        self.chunks.append(pts)
+        self.size += len(pts)
+        ap = _aperture(geom)
+        if ap is not None:
+            self.apertures.setdefault(ap.code, ap)
+        self.rows.append((len(self.chunks) - 1, start, self.size, np.asarray(origins, dtype=np.float64).reshape(-1, 2),
+                          KINDS[type(geom)], -1 if ap is None else ap.code))
+
+
+def pack_geometries(geometries, sx=1.0, sy=1.0):
+    packer = _Packer()
+    here = np.zeros((1, 2))
+    for geom in geometries:
+        if isinstance(geom, GeoInstanced):
+            for inner in geom.geometries:
+                packer.add(inner, geom.offsets)
+        elif isinstance(geom, GeoFlashBatch):
+            packer.add(geom.outline, geom.centers)
+        elif type(geom) in KINDS:
+            packer.add(geom, here)
+
+    vertices = np.concatenate(packer.chunks) if packer.chunks else np.empty((0, 2))
+    counts = np.array([len(row[3]) for row in packer.rows], dtype=np.int64)
+    repeat = lambda k: np.repeat(np.array([row[k] for row in packer.rows], dtype=np.int64), counts)
+    chunk, start, stop = repeat(0), repeat(1), repeat(2)
+    kind = repeat(4).astype(np.int8)
+    aperture = repeat(5).astype(np.int32)
+    origin = np.concatenate([row[3] for row in packer.rows]) if packer.rows else np.empty((0, 2))
+
+    # extent of every stored range in one reduceat pass, moved to each row's origin
+    if len(packer.chunks):
+        firsts = np.array([row[1] for row in packer.rows], dtype=np.int64)
+        lo = np.minimum.reduceat(vertices, firsts, axis=0)
+        hi = np.maximum.reduceat(vertices, firsts, axis=0)
+        bbox = np.hstack([lo[chunk] + origin, hi[chunk] + origin])
+    else:
+        bbox = np.empty((0, 4))
+
+    # the aperture table holds the sizes the scaled layer is drawn with
+    codes = sorted(packer.apertures)
+    table = [packer.apertures[c] if (sx, sy) == (1, 1) else packer.apertures[c].scale(sx, sy) for c in codes]
+    width = max((len(ap.params) for ap in table), default=0)
+    params = np.full((len(table), width), np.nan)
+    for k, ap in enumerate(table):
+        params[k, :len(ap.params)] = ap.params
+
+    return {
+        'version': np.array(FORMAT_VERSION),
+        'scale': np.array([sx, sy], dtype=np.float64),
+        'vertices': vertices,
+        'start': start,
+        'stop': stop,
+        'origin': origin,
+        'kind': kind,
+        'aperture': aperture,
+        'bbox': bbox,
+        'aperture_code': np.array(codes, dtype=np.int32),
+        'aperture_shape': np.array([ap.shape for ap in table], dtype='U8'),
+        'aperture_params': params,
+    }
+
+
+def write_npz(filename, geometries, sx=1.0, sy=1.0):
+    # stored, not deflated, so every array can be memory-mapped straight from the file
+    arrays = pack_geometries(geometries, sx, sy)
+    with open(filename, 'wb') as f:
+        np.savez(f, **arrays)
+    return filename
+
+
+def _npz_members(filename):
+    # name, dtype, shape, order and data offset of every .npy member of a stored npz
+    with zipfile.ZipFile(filename) as zf, open(filename, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{filename}: {info.filename} is compressed and cannot be mapped")
+            f.seek(info.header_offset)
+            header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+            f.seek(info.header_offset + ZIP_LOCAL_HEADER.size + header[-2] + header[-1])
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            yield info.filename[:-4], dtype, shape, 'F' if fortran else 'C', f.tell()
+
+
+class PackedGeometry:
+    # arrays are read-only memory maps of the file; nothing is parsed or copied on load
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name, value in arrays.items():
+            setattr(self, name, value)
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __repr__(self):
+        counts = np.bincount(self.kind, minlength=4)
+        return (f"PackedGeometry({counts[FLASH]} flashes, {counts[DRAW]} draws, {counts[ARC]} arcs, "
+                f"{counts[REGION]} regions, {len(self.vertices)} vertices)")
+
+    def points(self, k):
+        # a view into the vertex buffer, translated only for rows that place a shared range
+        pts = self.vertices[self.start[k]:self.stop[k]]
+        origin = self.origin[k]
+        return pts + origin if origin.any() else pts
+
+    def rows(self, kind):
+        return np.flatnonzero(self.kind == kind)
+
+
+def load_npz(filename, mmap=True):
+    if not mmap:
+        with np.load(filename) as data:
+            return PackedGeometry({name: data[name] for name in data.files})
+    arrays = {}
+    for name, dtype, shape, order, offset in _npz_members(filename):
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape, order=order)
+    if int(arrays.get('version', FORMAT_VERSION)) > FORMAT_VERSION:
+        raise ValueError(f"{filename}: packed geometry version {int(arrays['version'])} is newer than this reader")
+    return PackedGeometry(arrays)
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from parser import GerberParser
+from transformer import ScaleTransformer
+from geometry import geometries_bbox
+from sources import zip_members, is_gerber_name, source_name
+
+#Module for loading every layer of a gerber job concurrently
+
+
+class Layer:
+    def __init__(self, name, commands, apertures, units, original_geometries, scaled_geometries):
+        self.name = name
+        self.commands = commands
+        self.apertures = apertures
+        self.units = units
+        self.original_geometries = original_geometries
+        self.scaled_geometries = scaled_geometries
+
+    def bbox(self, scaled=False):
+        return geometries_bbox(self.scaled_geometries if scaled else self.original_geometries)
+
+    def __repr__(self):
+        return f"Layer({self.name!r}, {len(self.commands)} commands)"
+
+
+def load_layer(source, sx=1.0, sy=1.0):
+    parser = GerberParser(source)
+    cmds = parser.run()
+    orig_geom, scaled_geom, _ = ScaleTransformer(sx, sy).apply(cmds, parser.apertures)
+    return Layer(source_name(source), cmds, parser.apertures, parser.units, orig_geom, scaled_geom)
+
+
+class Job:
+    def __init__(self, sources, sx=1.0, sy=1.0):
+        self.sources = list(sources)
+        self.sx, self.sy = sx, sy
+        self.layers = {}
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        names = sorted(n for n in os.listdir(path) if is_gerber_name(n))
+        return cls([os.path.join(path, n) for n in names], **kwargs)
+
+    @classmethod
+    def from_archive(cls, path, **kwargs):
+        return cls(zip_members(path), **kwargs)
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        if os.path.isdir(path):
+            return cls.from_directory(path, **kwargs)
+        return cls.from_archive(path, **kwargs)
+
+    def load(self, max_workers=None):
+        if not self.sources:
+            return self.layers
+        # parser units are normalised to mm, so every layer already shares one frame
+        workers = max_workers or min(len(self.sources), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(load_layer, src, self.sx, self.sy) for src in self.sources]
+            self.layers = {}
+            for fut in futures:
+                layer = fut.result()
+                self.layers[layer.name] = layer
+        return self.layers
+
+    def bbox(self, scaled=False):
+        boxes = [b for b in (layer.bbox(scaled) for layer in self.layers.values()) if b is not None]
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        return np.concatenate([boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)])
+
+    def __getitem__(self, name):
+        return self.layers[name]
+
+    def __iter__(self):
+        return iter(self.layers.values())
+
+    def __len__(self):
+        return len(self.layers)
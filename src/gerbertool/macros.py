@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import os
+import pickle
+import tempfile
+import gerbonara
+import gerbonara.aperture_macros.parse as gp
+
+#Module for compiling aperture macros once per unique macro body
+
+
+def default_cache_dir():
+    base = os.environ.get('GERBERTOOL_CACHE') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'gerbertool')
+    return os.path.join(base, 'macros')
+
+
+def default_key_path():
+    # kept apart from the cache, which GERBERTOOL_CACHE may point at a shared directory
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(base, 'gerbertool', 'cache.key')
+
+
+def _secret(path):
+    # per-user key that signs cache entries; None turns persistence off
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(32))
+        st = os.stat(path)
+        # a key others can read or replace cannot vouch for anything
+        if st.st_mode & 0o077 or (hasattr(os, 'getuid') and st.st_uid != os.getuid()):
+            return None
+        with open(path, 'rb') as f:
+            secret = f.read()
+    except OSError:
+        return None
+    return secret if len(secret) >= 32 else None
+
+
+class MacroRegistry:
+    def __init__(self, cache_dir=None, persist=True, key_path=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.key_path = key_path or default_key_path()
+        self.persist = persist
+        self._macros = {}
+        self._secret = None
+
+    @staticmethod
+    def key(name, body, units):
+        # the gerbonara version is part of the key so an upgrade never loads stale pickles
+        text = '\0'.join((getattr(gerbonara, '__version__', ''), units, name, body))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, name, body, units):
+        key = self.key(name, body, units)
+        macro = self._macros.get(key)
+        if macro is None:
+            macro = self._load(key)
+            if macro is None:
+                macro = gp.ApertureMacro.parse_macro(name, body, units)
+                self._store(key, macro)
+            self._macros[key] = macro
+        return macro
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pkl')
+
+    def _sign(self, key, payload):
+        if self._secret is None:
+            self._secret = _secret(self.key_path)
+            if self._secret is None:
+                self.persist = False
+                return None
+        return hmac.new(self._secret, key.encode() + payload, hashlib.sha256).digest()
+
+    def _load(self, key):
+        # entries are a sha256 HMAC followed by the pickle; only signed ones are unpickled
+        if not self.persist:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        mac, payload = data[:32], data[32:]
+        expected = self._sign(key, payload)
+        if expected is None or not hmac.compare_digest(mac, expected):
+            return None
+        try:
+            return pickle.loads(payload)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _store(self, key, macro):
+        if not self.persist:
+            return
+        payload = pickle.dumps(macro, protocol=pickle.HIGHEST_PROTOCOL)
+        mac = self._sign(key, payload)
+        if mac is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a private temp file and rename, so concurrent workers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(mac + payload)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            pass
+
+    def clear(self):
+        self._macros.clear()
+
+    def __len__(self):
+        return len(self._macros)
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = MacroRegistry()
+    return _registry
@@ -0,0 +1,133 @@
+import numpy as np
+
+#Module for area, centroid, perimeter and extent metrics on packed geometry
+
+
+def pack(geometries):
+    # flattens geometries into one vertex buffer; index maps each packed entry back
+    # to its position in the geometry list (instanced blocks and flash batches expand
+    # to every copy)
+    chunks, counts, closed, index = [], [], [], []
+    for i, geom in enumerate(geometries):
+        if hasattr(geom, 'offsets') and hasattr(geom, 'geometries'):
+            for inner in geom.geometries:
+                pts = getattr(inner, 'points', None)
+                if pts is None or len(pts) == 0:
+                    continue
+                copies = geom.instances(inner)
+                chunks.append(copies.reshape(-1, 2))
+                counts.extend([copies.shape[1]] * len(copies))
+                closed.extend([getattr(inner, 'closed', True)] * len(copies))
+                index.extend([i] * len(copies))
+            continue
+        if hasattr(geom, 'centers') and hasattr(geom, 'flashes'):
+            if geom.template is None or len(geom.template) == 0 or len(geom.centers) == 0:
+                continue
+            outlines = geom.flashes()
+            chunks.append(outlines.reshape(-1, 2))
+            counts.extend([outlines.shape[1]] * len(outlines))
+            closed.extend([True] * len(outlines))
+            index.extend([i] * len(outlines))
+            continue
+        pts = getattr(geom, 'points', None)
+        if pts is None or len(pts) == 0:
+            continue
+        pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+        chunks.append(pts)
+        counts.append(len(pts))
+        closed.append(getattr(geom, 'closed', True))
+        index.append(i)
+    vertices = np.concatenate(chunks) if chunks else np.empty((0, 2))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return vertices, offsets, np.array(closed, dtype=bool), np.array(index, dtype=np.int64)
+
+
+def polygon_metrics(vertices, offsets, closed=None, eps=1e-12):
+    vertices = np.asarray(vertices, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    if n <= 0:
+        empty = np.empty(0)
+        return {'area': empty, 'centroid': np.empty((0, 2)), 'perimeter': empty, 'bbox': np.empty((0, 4))}
+    if closed is None:
+        closed = np.ones(n, dtype=bool)
+
+    starts = offsets[:-1]
+    last = offsets[1:] - 1
+    counts = np.diff(offsets)
+    nxt = np.arange(1, len(vertices) + 1)
+    nxt[last] = starts
+
+    x, y = vertices[:, 0], vertices[:, 1]
+    xn, yn = x[nxt], y[nxt]
+
+    # shoelace over every contour at once
+    cross = x * yn - xn * y
+    area = 0.5 * np.add.reduceat(cross, starts)
+    area[~closed] = 0.0
+
+    mean = np.column_stack([np.add.reduceat(x, starts), np.add.reduceat(y, starts)]) / counts[:, None]
+    centroid = mean.copy()
+    solid = np.abs(area) > eps
+    if solid.any():
+        cx = np.add.reduceat((x + xn) * cross, starts)
+        cy = np.add.reduceat((y + yn) * cross, starts)
+        centroid[solid, 0] = cx[solid] / (6 * area[solid])
+        centroid[solid, 1] = cy[solid] / (6 * area[solid])
+
+    edges = np.hypot(xn - x, yn - y)
+    # open paths do not have a closing edge
+    edges[last[~closed]] = 0.0
+    perimeter = np.add.reduceat(edges, starts)
+
+    bbox = np.column_stack([np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                            np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts)])
+    return {'area': area, 'centroid': centroid, 'perimeter': perimeter, 'bbox': bbox}
+
+
+def geometry_metrics(geometries):
+    vertices, offsets, closed, index = pack(geometries)
+    result = polygon_metrics(vertices, offsets, closed)
+    result['index'] = index
+    result['closed'] = closed
+    return result
+
+
+def polygon_centroid(points):
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    return polygon_metrics(pts, np.array([0, len(pts)]))['centroid'][0]
+
+
+def compare(original, scaled):
+    orig = geometry_metrics(original)
+    new = geometry_metrics(scaled)
+    if len(orig['index']) != len(new['index']) or not np.array_equal(orig['index'], new['index']):
+        raise ValueError("original and scaled geometries do not line up")
+
+    a0 = np.abs(orig['area'])
+    a1 = np.abs(new['area'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(a0 > 0, a1 / a0, np.nan)
+    displacement = np.hypot(*(new['centroid'] - orig['centroid']).T)
+
+    return {
+        'index': orig['index'],
+        'area_original': a0,
+        'area_scaled': a1,
+        'area_ratio': ratio,
+        'displacement': displacement,
+        'total_area_original': float(a0.sum()),
+        'total_area_scaled': float(a1.sum()),
+        'max_displacement': float(displacement.max()) if len(displacement) else 0.0,
+        'mean_area_ratio': float(np.nanmean(ratio)) if np.isfinite(ratio).any() else float('nan'),
+    }
+
+
+def format_report(report):
+    lines = [
+        f"features:          {len(report['index'])}",
+        f"copper area:       {report['total_area_original']:.4f} -> {report['total_area_scaled']:.4f} mm^2",
+        f"mean area ratio:   {report['mean_area_ratio']:.6f}",
+        f"max displacement:  {report['max_displacement']:.6f} mm",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,124 @@
+import numpy as np
+
+#Module for offsetting whole polygon contours with array operations
+
+
+def _clean(points, eps=1e-12):
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(pts) == 0:
+        return pts, False
+    closed = len(pts) > 1 and np.allclose(pts[0], pts[-1])
+    if closed:
+        pts = pts[:-1]
+    # consecutive duplicates give zero length edges without a direction
+    keep = np.hypot(*(pts - np.roll(pts, 1, axis=0)).T) > eps
+    if not keep.any():
+        return pts[:1], closed
+    return pts[keep], closed
+
+
+def signed_area(points):
+    x, y = np.asarray(points, dtype=float).T
+    return 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+
+
+def offset_contour(points, dx, dy, join='miter', miter_limit=2.0, arc_points=8, outward=None):
+    # moves every edge along its outward normal, scaled per axis by (dx, dy), and
+    # rebuilds the corners from the intersections of adjacent offset edges
+    return offset_contour_variants(points, [dx], [dy], join, miter_limit, arc_points, outward)[0]
+
+
+def offset_contour_variants(points, dx, dy, join='miter', miter_limit=2.0, arc_points=8, outward=None):
+    # offset_contour for a whole list of (dx, dy) pairs; the corner geometry is worked
+    # out once and the distances are broadcast over a leading variant axis
+    dx = np.atleast_1d(np.asarray(dx, dtype=float))
+    dy = np.atleast_1d(np.asarray(dy, dtype=float))
+    pts, closed = _clean(points)
+    n = len(pts)
+    original = np.asarray(points, dtype=float)
+    if n < 3:
+        return [original] * len(dx)
+
+    # outward is the right-hand side of a counter-clockwise contour
+    if outward is None:
+        outward = 1.0 if signed_area(pts) >= 0 else -1.0
+    e = np.roll(pts, -1, axis=0) - pts
+    length = np.hypot(e[:, 0], e[:, 1])
+    normal = outward * np.column_stack([e[:, 1], -e[:, 0]]) / length[:, None]
+    t = normal[None, :, :] * np.column_stack([dx, dy])[:, None, :]
+
+    # vertex k joins edge k-1 (incoming) and edge k (outgoing)
+    e_in = np.roll(e, 1, axis=0)
+    t_in = np.roll(t, 1, axis=1)
+    a = pts + t_in
+    b = pts + t
+    denom = e_in[:, 0] * e[:, 1] - e_in[:, 1] * e[:, 0]
+    diff = b - a
+    parallel = np.abs(denom) < 1e-12 * length * np.roll(length, 1)
+    s = np.where(parallel, 0.0, (diff[..., 0] * e[:, 1] - diff[..., 1] * e[:, 0]) / np.where(parallel, 1.0, denom))
+    miter = a + s[..., None] * e_in
+    miter[:, parallel] = (a[:, parallel] + b[:, parallel]) / 2
+
+    # only corners that open up in the offset direction need a join
+    reach = np.maximum(np.hypot(t_in[..., 0], t_in[..., 1]), np.hypot(t[..., 0], t[..., 1]))
+    spread = np.hypot(*np.moveaxis(miter - pts, -1, 0))
+    opening = np.einsum('...j,...j->...', miter - pts, t_in + t) > 0
+    if join == 'miter':
+        # miter up to the limit, bevel beyond it
+        limited = opening & (spread > miter_limit * reach)
+        join = 'bevel'
+    else:
+        # nearly straight corners (tessellated curves) keep their miter point
+        limited = opening & (spread > reach * 1.001)
+
+    if join == 'round':
+        slots = max(int(arc_points), 2)
+    else:
+        slots = 2
+    cand = np.repeat(miter[:, :, None, :], slots, axis=2)
+    mask = np.zeros(cand.shape[:3], dtype=bool)
+    mask[..., 0] = True
+
+    if limited.any():
+        idx = np.nonzero(limited)
+        if join == 'round':
+            ang_a = np.arctan2(t_in[idx][:, 1], t_in[idx][:, 0])
+            ang_b = np.arctan2(t[idx][:, 1], t[idx][:, 0])
+            sweep = (ang_b - ang_a + np.pi) % (2 * np.pi) - np.pi
+            r_a = np.hypot(*t_in[idx].T)
+            r_b = np.hypot(*t[idx].T)
+            f = np.linspace(0.0, 1.0, slots)
+            ang = ang_a[:, None] + sweep[:, None] * f
+            r = r_a[:, None] + (r_b - r_a)[:, None] * f
+            cand[idx] = pts[idx[1], None, :] + np.stack([r * np.cos(ang), r * np.sin(ang)], axis=2)
+        else:
+            cand[idx + (0,)] = a[idx]
+            cand[idx + (1,)] = b[idx]
+        mask[idx] = True
+
+    result = []
+    for k in range(len(dx)):
+        if dx[k] == 0 and dy[k] == 0:
+            result.append(original)
+            continue
+        out = cand[k][mask[k]]
+        if closed:
+            out = np.vstack([out, out[:1]])
+        result.append(out)
+    return result
+
+
+def offset_polygon(contours, dx, dy, join='miter', miter_limit=2.0, arc_points=8):
+    # the first contour is the outline, the rest are holes; the outline moves to
+    # its outside and every hole to its own inside, whatever their winding
+    result = []
+    for i, contour in enumerate(contours):
+        pts, _ = _clean(contour)
+        if len(pts) < 3:
+            result.append(np.asarray(contour, dtype=float))
+            continue
+        outward = 1.0 if signed_area(pts) >= 0 else -1.0
+        if i > 0:
+            outward = -outward
+        result.append(offset_contour(contour, dx, dy, join, miter_limit, arc_points, outward=outward))
+    return result
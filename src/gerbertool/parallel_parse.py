@@ -0,0 +1,214 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from parser import GerberParser
+from commands import FlashCommand, DrawCommand, RegionCommand, ArcCommand
+from sources import iter_text_chunks
+
+#Module for parsing one large gerber file in chunks across worker processes
+
+# row kinds in the decoded arrays
+OP, TOOL, REGION_ON, REGION_OFF, SR_OPEN, SR_CLOSE = range(6)
+
+HEADER_RE = re.compile(r'%[^%]*%|^G7[01]\*', re.M)
+# one statement per line: an optional G code, coordinates and a D code, or a %SR block
+STATEMENT_RE = re.compile(
+    r'^(?:G0?([1-3])|G3([67])|G5[04])?'
+    r'(?:X([-+]?\d+))?(?:Y([-+]?\d+))?(?:I([-+]?\d+))?(?:J([-+]?\d+))?'
+    r'(?:D0*(\d+))?\*[ \t\r]*$'
+    r'|^(%SR)(?:X(\d+)Y(\d+)I([-+]?[\d.]+)J([-+]?[\d.]+))?\*%',
+    re.M)
+
+
+def split_chunks(text, parts):
+    # cuts at line ends outside of %...% blocks, so no statement is split
+    size = max(len(text) // max(parts, 1), 1)
+    bounds = [0]
+    pos = size
+    while pos < len(text):
+        nl = text.find('\n', pos)
+        while nl >= 0 and text.count('%', bounds[-1], nl) % 2:
+            close = text.find('%', nl)
+            nl = -1 if close < 0 else text.find('\n', close)
+        if nl < 0:
+            break
+        bounds.append(nl + 1)
+        pos = nl + 1 + size
+    bounds.append(len(text))
+    return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _decode_column(col, zero_suppression, digits, divisor):
+    values = np.full(len(col), np.nan)
+    present = col != ''
+    if not present.any():
+        return values
+    raw = col[present]
+    neg = np.char.startswith(raw, '-')
+    raw = np.char.lstrip(raw, '+-')
+    if zero_suppression != 'leading':
+        raw = np.char.ljust(raw, digits, '0')
+    ints = raw.astype(np.int64)
+    values[present] = np.where(neg, -ints, ints) / divisor
+    return values
+
+
+def decode_chunk(text, fmt):
+    # tokenizes a chunk into typed arrays; modal state is resolved later by the parent
+    rows = STATEMENT_RE.findall(text)
+    n = len(rows)
+    kind = np.zeros(n, dtype=np.int8)
+    gcode = np.zeros(n, dtype=np.int8)
+    dcode = np.zeros(n, dtype=np.int32)
+    coords = np.full((n, 4), np.nan)
+    if n == 0:
+        return {'kind': kind, 'g': gcode, 'd': dcode, 'xyij': coords}
+
+    table = np.array(rows, dtype=str)
+    g, region, d = table[:, 0], table[:, 1], table[:, 6]
+    sr = table[:, 7] != ''
+
+    gcode[g != ''] = g[g != ''].astype(np.int8)
+    has_d = d != ''
+    dcode[has_d] = d[has_d].astype(np.int32)
+    kind[dcode >= 10] = TOOL
+    kind[region == '6'] = REGION_ON
+    kind[region == '7'] = REGION_OFF
+
+    digits_x = fmt['int_digits_x'] + fmt['frac_digits_x']
+    digits_y = fmt['int_digits_y'] + fmt['frac_digits_y']
+    unit = 25.4 if fmt['units'] == 'in' else 1.0
+    zs = fmt['zero_suppression']
+    coords[:, 0] = _decode_column(table[:, 2], zs, digits_x, fmt['div_x']) * unit
+    coords[:, 1] = _decode_column(table[:, 3], zs, digits_y, fmt['div_y']) * unit
+    coords[:, 2] = _decode_column(table[:, 4], zs, digits_x, fmt['div_x']) * unit
+    coords[:, 3] = _decode_column(table[:, 5], zs, digits_y, fmt['div_y']) * unit
+
+    # %SR rows carry the repeat counts and raw steps in the coordinate columns
+    if sr.any():
+        nx, ny, i, j = (table[sr, k] for k in range(8, 12))
+        opened = nx != ''
+        kind[sr] = np.where(opened, SR_OPEN, SR_CLOSE)
+        block = np.zeros((sr.sum(), 4))
+        block[opened] = np.column_stack([nx[opened], ny[opened], i[opened], j[opened]]).astype(float)
+        coords[sr] = block
+    return {'kind': kind, 'g': gcode, 'd': dcode, 'xyij': coords}
+
+
+class ParallelGerberParser(GerberParser):
+    def __init__(self, filepath, max_workers=None, chunks_per_worker=4):
+        super().__init__(filepath)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+
+    def run(self):
+        text = ''.join(iter_text_chunks(self.filepath))
+        self._parse_header(text)
+        fmt = {name: getattr(self, name) for name in
+               ('units', 'zero_suppression', 'int_digits_x', 'frac_digits_x',
+                'int_digits_y', 'frac_digits_y', 'div_x', 'div_y')}
+
+        chunks = split_chunks(text, self.max_workers * self.chunks_per_worker)
+        del text
+        if self.max_workers == 1 or len(chunks) == 1:
+            decoded = [decode_chunk(chunk, fmt) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                decoded = list(pool.map(decode_chunk, chunks, repeat(fmt)))
+        self.commands = []
+        self._resolve(decoded)
+        return self.commands
+
+    def _parse_header(self, text):
+        # format, units, macros and apertures are read up front and shared with the workers
+        self._am_block = None
+        for m in HEADER_RE.finditer(text):
+            for line in m[0].split('\n'):
+                line = line.strip()
+                if line:
+                    self._unit_line(line)
+                    self._format_line(line)
+                    self._macro_line(line)
+                    self._aperture_line(line)
+
+    def _resolve(self, decoded):
+        # sequential fix-up of the modal state (aperture, current point, interpolation,
+        # region, step-and-repeat) that runs across chunk seams
+        last_x = last_y = None
+        mode = 1
+        current_ap = None
+        in_region = False
+        region_pts = []
+        open_draw = None
+        outer_cmds = None
+        repeat = None
+
+        for arrays in decoded:
+            rows = zip(arrays['kind'].tolist(), arrays['g'].tolist(),
+                       arrays['d'].tolist(), arrays['xyij'].tolist())
+            for kind, g, d, (x, y, i, j) in rows:
+                if kind == TOOL:
+                    current_ap = self.apertures.get(d)
+                    open_draw = None
+                    continue
+                if kind == REGION_ON:
+                    in_region = True
+                    region_pts = [] if last_x is None else [(last_x, last_y)]
+                    open_draw = None
+                    continue
+                if kind == REGION_OFF:
+                    if region_pts:
+                        self.commands.append(RegionCommand(region_pts.copy()))
+                    in_region = False
+                    continue
+                if kind in (SR_OPEN, SR_CLOSE):
+                    open_draw = None
+                    if outer_cmds is not None:
+                        self._close_step_repeat(outer_cmds, repeat)
+                        outer_cmds = None
+                    if kind == SR_OPEN:
+                        step_x, step_y = (i * 25.4, j * 25.4) if self.units == 'in' else (i, j)
+                        repeat = (int(x), int(y), step_x, step_y)
+                        outer_cmds, self.commands = self.commands, []
+                    continue
+
+                if g:
+                    mode = g
+                # coordinates are modal, a missing one keeps its current value
+                if x != x:
+                    x = last_x
+                if y != y:
+                    y = last_y
+                if d == 2:
+                    last_x, last_y = x, y
+                    open_draw = None
+                    if in_region:
+                        if len(region_pts) >= 3:
+                            self.commands.append(RegionCommand(region_pts))
+                        region_pts = [(x, y)]
+                elif d == 3:
+                    last_x, last_y = x, y
+                    open_draw = None
+                    if current_ap and x is not None:
+                        self.commands.append(FlashCommand(x, y, current_ap))
+                elif d == 1 and x is not None and y is not None:
+                    if in_region:
+                        region_pts.append((x, y))
+                    elif current_ap and mode == 1:
+                        if open_draw is not None:
+                            open_draw.path.append((x, y))
+                        else:
+                            start = [] if last_x is None else [(last_x, last_y)]
+                            open_draw = DrawCommand(start + [(x, y)], current_ap)
+                            self.commands.append(open_draw)
+                    elif current_ap:
+                        start = None if last_x is None else (last_x, last_y)
+                        self.commands.append(ArcCommand((x, y), 0.0 if i != i else i, 0.0 if j != j else j,
+                                                        mode == 2, current_ap, start))
+                        open_draw = None
+                    last_x, last_y = x, y
+
+        if outer_cmds is not None:
+            self._close_step_repeat(outer_cmds, repeat)
@@ -1,10 +1,13 @@
 import re
-from commands import GerberCommand, FlashCommand, DrawCommand, RegionCommand, ArcCommand
-from apertures import ApertureDefinition
-import gerbonara.aperture_macros.parse as gp
+import warnings
+from commands import GerberCommand, FlashCommand, DrawCommand, RegionCommand, ArcCommand, StepRepeatCommand
+from apertures import ApertureDefinition, ApertureTable
+from sources import iter_lines
+from macros import get_registry
 
 class GerberParser:
-    def __init__(self, filepath: str):
+    def __init__(self, filepath):
+        # a path, ArchiveMember, bytes or binary/text stream; gzip data is detected and inflated on the fly
         self.filepath = filepath
         self.lines= []
         self.units = 'mm'
@@ -14,14 +17,17 @@ class GerberParser:
         self.divisor= 10 ** self.frac_digits
         self.coord_mode= 'absolute'
 
-        self.apertures= {}
+        self.apertures= ApertureTable()
         self.macro_defs= {}
         self.macro_params={}
         self.commands= []
+        self._am_block = None
 
     def load_file(self):
-        with open(self.filepath, 'r') as f:
-            self.lines = [ln.strip() for ln in f if ln.strip()]
+        self.lines = list(self._stream_lines())
+
+    def _stream_lines(self):
+        return (ln for ln in map(str.strip, iter_lines(self.filepath)) if ln)
 
 
     def _split_commands(self, data):
@@ -44,71 +50,97 @@ class GerberParser:
 
     def detect_units(self):
         for line in self.lines:
-            if '%MOIN*' in line or line.startswith('G70'):
-                self.units = 'inches'
-            elif '%MOMM*' in line or line.startswith('G71'):
-                self.units = 'mm'
+            self._unit_line(line)
+
+    def _unit_line(self, line):
+        if '%MOIN*' in line or line.startswith('G70'):
+            self.units = 'inches'
+        elif '%MOMM*' in line or line.startswith('G71'):
+            self.units = 'mm'
 
     def parse_format(self):
-  
+        for line in self.lines:
+            self._format_line(line)
+
+    def _format_line(self, line):
         fs_re = re.compile(r'%FS([LT])([AI])X(\d)(\d)Y(\d)(\d)\*%')
         mo_re = re.compile(r'%MO(IN|MM)\*%')
-        for line in self.lines:
-            m = fs_re.match(line)
-            if m:
-                self.zero_suppression = 'leading' if m.group(1)=='L' else 'trailing'
-                self.coord_mode      = 'absolute'  if m.group(2)=='A' else 'incremental'
-                self.int_digits_x    = int(m.group(3))
-                self.frac_digits_x   = int(m.group(4))
-                self.int_digits_y    = int(m.group(5))
-                self.frac_digits_y   = int(m.group(6))
-                self.div_x = 10 ** self.frac_digits_x
-                self.div_y = 10 ** self.frac_digits_y
-            m2 = mo_re.match(line)
-            if m2:
-                self.units = 'in' if m2.group(1)=='IN' else 'mm'
+        m = fs_re.match(line)
+        if m:
+            self.zero_suppression = 'leading' if m.group(1)=='L' else 'trailing'
+            self.coord_mode      = 'absolute'  if m.group(2)=='A' else 'incremental'
+            self.int_digits_x    = int(m.group(3))
+            self.frac_digits_x   = int(m.group(4))
+            self.int_digits_y    = int(m.group(5))
+            self.frac_digits_y   = int(m.group(6))
+            self.div_x = 10 ** self.frac_digits_x
+            self.div_y = 10 ** self.frac_digits_y
+        m2 = mo_re.match(line)
+        if m2:
+            self.units = 'in' if m2.group(1)=='IN' else 'mm'
 
 
 
 
     def parse_macro_definitions(self):
-   
-        import gerbonara.aperture_macros.parse as gp
+        self._am_block = None
+        for line in self.lines:
+            self._macro_line(line)
+
+    def _macro_line(self, line):
+        # %AM blocks can span several lines; the open block is kept in self._am_block
         NAME = r"[a-zA-Z_$\.][a-zA-Z_$\.0-9+\-]+"
-        am_start=re.compile(fr"AM(?P<name>{NAME})\*(?P<macro>[^%]*)")
-        i = 0
-        for line in self._split_commands(self.lines):
-            m = am_start.match(line)
-            if m:
-                i += 1
-                self.macro_params[m['name']]=m.group('macro') 
-                macro = gp.ApertureMacro.parse_macro(m['name'],m['macro'], self.units)
-                self.macro_defs[m['name']] = macro
-            i += 1
+        am_re = re.compile(fr"%AM(?P<name>{NAME})\*(?P<macro>[^%]*)%", re.DOTALL)
+        block = self._am_block
+        if block is None:
+            if not line.startswith('%AM'):
+                return
+            block = self._am_block = [line]
+        else:
+            block.append(line)
+        if not line.endswith('%'):
+            return
+        if len(block) == 1 and line.count('%') < 2:
+            return
+        m = am_re.match('\n'.join(block))
+        self._am_block = None
+        if m:
+            self.macro_params[m['name']] = m['macro']
+            self.macro_defs[m['name']] = get_registry().get(m['name'], m['macro'], self.units)
 
     def parse_apertures(self):
-        add_re = re.compile(r'%ADD(\d+)([A-Za-z0-9_]+)(?:,([^*]+))?\*%')
-
         for line in self.lines:
-            m = add_re.match(line)
-            if not m:
-                continue
-            code   = int(m.group(1))
-            name   = m.group(2)
-            param_str = m.group(3) or ''
-            if name in self.macro_defs:
-                
-                if param_str=='':
-                    vals=[]
-                else:
-                    vals=[ float(val) for val in param_str.strip(' ,').split('X') ]
+            self._aperture_line(line)
 
-                if self.units == 'in':
-                    vals = [v * 25.4 for v in vals]
-                aperture = ApertureDefinition.from_macro(code, self.macro_defs[name], vals, self.units)
+    def _aperture_line(self, line):
+        add_re = re.compile(r'%ADD(\d+)([A-Za-z0-9_]+)(?:,([^*]+))?\*%')
+        m = add_re.match(line)
+        if not m:
+            return
+        code   = int(m.group(1))
+        name   = m.group(2)
+        param_str = m.group(3) or ''
+        if name in self.macro_defs:
+            
+            if param_str=='':
+                vals=[]
             else:
+                vals=[ float(val) for val in param_str.strip(' ,').split('X') ]
+
+            if self.units == 'in':
+                vals = [v * 25.4 for v in vals]
+            aperture = ApertureDefinition.from_macro(code, self.macro_defs[name], vals, self.units)
+        else:
+            try:
                 aperture = ApertureDefinition.parse(line, units=self.units)
-            self.apertures[code] = aperture
+            except ValueError:
+                aperture = None
+        if aperture is None:
+            # skipped like any other line the parser does not know, with a warning since
+            # later uses of the D-code will have nothing to draw with
+            warnings.warn(f"skipping aperture definition that cannot be read: {line}", stacklevel=2)
+            return
+        self.apertures.intern(aperture)
 
 
     def _parse_coord(self, raw):
@@ -151,10 +183,32 @@ class GerberParser:
 
 
     def parse_commands(self):
+        # batch mode: every command stays in self.commands
+        for _ in self._iter_parsed(self.lines):
+            pass
+
+    def iter_commands(self, chunk_size=4096):
+        # single pass over the source; header, macro and aperture lines are applied as
+        # they come and finished commands are handed out in lists of about chunk_size
+        yield from self._iter_parsed(self._header_lines(self._stream_lines()), chunk_size)
+
+    def _header_lines(self, lines):
+        for line in lines:
+            if line[0] == '%' or line.startswith(('G70', 'G71')) or self._am_block is not None:
+                self._unit_line(line)
+                self._format_line(line)
+                self._macro_line(line)
+                self._aperture_line(line)
+            yield line
+
+    def _iter_parsed(self, lines, chunk_size=None, resume=None, checkpoint=None):
+        # resume=(last_x, last_y, aperture) continues from a checkpoint; checkpoint(last_x,
+        # last_y, aperture) is called before every line where nothing is half-built
 
         flash_re = re.compile(r'^(?:G01)?X([-+]?\d+)Y([-+]?\d+)D03\*$')
         draw_re  = re.compile(r'^(?:G01)?X([-+]?\d+)Y([-+]?\d+)D0([12])\*$')
-        arc_re   = re.compile(r'^G0([23])X([-+]?\d+)Y([-+]?\d+)I([-+]?\d+)J([-+]?\d+)\*$')
+        line_re  = re.compile(r'^(?:G0?1)?(?:X([-+]?\d+))?(?:Y([-+]?\d+))?D0?1\*$')
+        arc_re   = re.compile(r'^G0([23])X([-+]?\d+)Y([-+]?\d+)I([-+]?\d+)J([-+]?\d+)(?:D0?1)?\*$')
         region_on  = re.compile(r'^G36\*$')
         region_off = re.compile(r'^G37\*$')
         tool_re  = re.compile(r'^(?:G5[04])?D(\d+)\*$')
@@ -163,6 +217,7 @@ class GerberParser:
         move_y_only    =re.compile(r'^(?:G0?1)?Y([-+]?\d+)D02\*$')
         flash_xy_re    = re.compile(r'^(?:G0?1)?X([-+]?\d+)Y([-+]?\d+)D03\*$')
         flash_only_re  = re.compile(r'^D03\*$')
+        sr_re          = re.compile(r'^%SR(?:X(\d+)Y(\d+)I([-+]?[\d.]+)J([-+]?[\d.]+))?\*%$')
         last_x = None
         last_y = None
 
@@ -170,30 +225,74 @@ class GerberParser:
         
         self.commands = []
         current_ap = None
+        if resume is not None:
+            last_x, last_y, current_ap = resume
         in_region  = False
         region_pts = []
+        outer_cmds = None
+        repeat     = None
+        # polyline being extended by consecutive D01s with the same aperture
+        open_draw  = None
 
-        for line in self.lines:
+        for line in lines:
+
+            # a step-and-repeat block and the draw being extended are not finished yet
+            if chunk_size and outer_cmds is None and len(self.commands) >= chunk_size:
+                yield self._take_finished(open_draw)
+
+            if (checkpoint is not None and open_draw is None and not in_region
+                    and outer_cmds is None and self._am_block is None):
+                checkpoint(last_x, last_y, current_ap)
 
             if line.startswith('G04'):
                 continue
 
             if line == 'M02*':
                 continue
+
+            m = sr_re.match(line)
+            if m:
+                # a new %SR also closes the previous block
+                open_draw = None
+                if outer_cmds is not None:
+                    self._close_step_repeat(outer_cmds, repeat)
+                    outer_cmds = None
+                if m.group(1):
+                    repeat = self._parse_step_repeat(m)
+                    outer_cmds, self.commands = self.commands, []
+                continue
             m = move_re.match(line)
             if m:
                 
                 last_x, last_y = self._extract_xy(m.group(1), m.group(2))
+                open_draw = None
+                if in_region:
+                    # D02 inside G36 starts a new contour
+                    if len(region_pts) >= 3:
+                        self.commands.append(RegionCommand(region_pts))
+                    region_pts = [(last_x, last_y)]
 
                 continue
             else: 
                 m=move_x_only.match(line)
                 if m:
                     last_x, _ =self._extract_xy(m.group(1), '0')
+                    open_draw = None
+                    if in_region:
+                        # D02 inside G36 starts a new contour
+                        if len(region_pts) >= 3:
+                            self.commands.append(RegionCommand(region_pts))
+                        region_pts = [(last_x, last_y)]
      
                 m=move_y_only.match(line)
                 if m:
                     _, last_y= self._extract_xy('0', m.group(1))
+                    open_draw = None
+                    if in_region:
+                        # D02 inside G36 starts a new contour
+                        if len(region_pts) >= 3:
+                            self.commands.append(RegionCommand(region_pts))
+                        region_pts = [(last_x, last_y)]
                     
 
 
@@ -201,6 +300,7 @@ class GerberParser:
             if m and current_ap:
                 x, y = self._extract_xy(m.group(1), m.group(2))
                 last_x, last_y = x, y
+                open_draw = None
                 
 
                 self.commands.append(FlashCommand(x, y, current_ap))
@@ -208,6 +308,7 @@ class GerberParser:
                 continue
             if flash_only_re.match(line) and current_ap and last_x is not None:
                 self.commands.append(FlashCommand(last_x, last_y, current_ap))
+                open_draw = None
                 
 
                 continue
@@ -217,15 +318,18 @@ class GerberParser:
                 
                 code = int(m.group(1))
                 current_ap = self.apertures.get(code)
+                open_draw = None
                 continue
 
 
             if region_on.match(line):
                 in_region  = True
-                region_pts = []
+                region_pts = [] if last_x is None else [(last_x, last_y)]
+                open_draw = None
                 continue
             if region_off.match(line):
-                self.commands.append(RegionCommand(region_pts.copy()))
+                if region_pts:
+                    self.commands.append(RegionCommand(region_pts.copy()))
                 in_region = False
                 continue
 
@@ -235,25 +339,36 @@ class GerberParser:
                 if m:
                     x, y = self._extract_xy(m.group(1), m.group(2))
                     region_pts.append((x, y))
+                    last_x, last_y = x, y
                 continue
 
 
             m = flash_re.match(line)
             if m and current_ap:
                 x, y = self._extract_xy(m.group(1), m.group(2))
+                last_x, last_y = x, y
+                open_draw = None
                 self.commands.append(FlashCommand(x, y, current_ap))
 
    
                 continue
 
 
-            m = draw_re.match(line)
-            if m and current_ap:
-                x, y = self._extract_xy(m.group(1), m.group(2))
-                mode = 'draw' if m.group(3) == '1' else 'move'
-                cmd  = DrawCommand([(x, y)], current_ap)
-                cmd.mode = mode
-                self.commands.append(cmd)
+            m = line_re.match(line)
+            if m and current_ap and (m.group(1) or m.group(2)):
+                x, y = self._extract_xy(m.group(1) or '0', m.group(2) or '0')
+                # coordinates are modal, a missing one keeps its current value
+                if m.group(1) is None and last_x is not None:
+                    x = last_x
+                if m.group(2) is None and last_y is not None:
+                    y = last_y
+                if open_draw is not None:
+                    open_draw.path.append((x, y))
+                else:
+                    start = [] if last_x is None else [(last_x, last_y)]
+                    open_draw = DrawCommand(start + [(x, y)], current_ap)
+                    self.commands.append(open_draw)
+                last_x, last_y = x, y
                 continue
 
 
@@ -262,9 +377,41 @@ class GerberParser:
                 cw = (m.group(1) == '2')
                 x, y = self._extract_xy(m.group(2), m.group(3))
                 i, j = self._extract_xy(m.group(4), m.group(5))
-                self.commands.append(ArcCommand((x, y), i, j, cw, current_ap))
+                start = None if last_x is None else (last_x, last_y)
+                self.commands.append(ArcCommand((x, y), i, j, cw, current_ap, start))
+                last_x, last_y = x, y
+                open_draw = None
                 continue
 
+        if outer_cmds is not None:
+            self._close_step_repeat(outer_cmds, repeat)
+        if chunk_size and self.commands:
+            yield self._take_finished(None)
+
+    def _take_finished(self, open_draw):
+        keep = 1 if self.commands and self.commands[-1] is open_draw else 0
+        done = self.commands[:len(self.commands) - keep]
+        self.commands = self.commands[len(self.commands) - keep:]
+        return done
+
+    def _parse_step_repeat(self, m):
+        nx, ny = int(m.group(1)), int(m.group(2))
+        step_x, step_y = float(m.group(3)), float(m.group(4))
+        if self.units == 'in':
+            step_x *= 25.4
+            step_y *= 25.4
+        return nx, ny, step_x, step_y
+
+    def _close_step_repeat(self, outer_cmds, repeat):
+        block = self.commands
+        self.commands = outer_cmds
+        if not block:
+            return
+        if repeat[0] * repeat[1] == 1:
+            self.commands.extend(block)
+        else:
+            self.commands.append(StepRepeatCommand(block, *repeat))
+
     def run(self):
         self.load_file()
         self.detect_units()
@@ -0,0 +1,81 @@
+import numpy as np
+from ezdxf.addons import r12writer
+from parser import GerberParser
+from transformer import ScaleTransformer
+from gerber_writer import GerberExporter
+from geometry import GeoAperture, GeoRegion, GeoInstanced, GeoFlashBatch
+
+#Module for streaming one layer from parse to export in bounded memory
+
+# commands per chunk; peak memory is about one chunk of tessellated geometry
+# (a step-and-repeat block is always kept whole)
+CHUNK_SIZE = 4096
+
+
+class StreamingDXFWriter:
+    # R12 entities go straight to the file, nothing is kept once a chunk is written
+    def __init__(self, filename):
+        self.filename = filename
+        self._ctx = None
+        self._dxf = None
+
+    def __enter__(self):
+        self._ctx = r12writer(self.filename)
+        self._dxf = self._ctx.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._dxf = None
+        return self._ctx.__exit__(*exc)
+
+    def write(self, geometries):
+        for geom in geometries:
+            if isinstance(geom, GeoInstanced):
+                # the fast R12 writer has no blocks, so every copy is written out
+                for inner in geom.geometries:
+                    stroke = getattr(inner, 'stroke', None)
+                    if stroke is not None:
+                        for ox, oy in geom.offsets:
+                            self._outlines(stroke + np.array([ox, oy]))
+                    elif inner.points is not None and len(inner.points):
+                        for copy in geom.instances(inner):
+                            self._polyline(copy, self._closed(inner, copy))
+                continue
+            if isinstance(geom, GeoFlashBatch):
+                if geom.template is not None and len(geom.template):
+                    self._outlines(geom.flashes())
+                continue
+            stroke = getattr(geom, 'stroke', None)
+            if stroke is not None:
+                self._outlines(stroke)
+                continue
+            pts = geom.points
+            if pts is None or len(pts) == 0:
+                continue
+            self._polyline(pts, self._closed(geom, pts))
+
+    def _closed(self, geom, pts):
+        return isinstance(geom, (GeoAperture, GeoRegion)) or bool(np.allclose(pts[0], pts[-1]))
+
+    def _outlines(self, outlines):
+        for outline in outlines:
+            self._polyline(outline, True)
+
+    def _polyline(self, pts, closed):
+        self._dxf.add_polyline_2d(np.asarray(pts, dtype=float).tolist(), closed=closed)
+
+
+def stream_dxf(source, filename, sx, sy, chunk_size=CHUNK_SIZE, stroke=False, method='normal'):
+    parser = GerberParser(source)
+    transformer = ScaleTransformer(sx, sy, stroke=stroke, method=method)
+    with StreamingDXFWriter(filename) as writer:
+        for _, scaled in transformer.iter_apply(parser.iter_commands(chunk_size)):
+            writer.write(scaled)
+    print(f"DXF saved to {filename}")
+    return filename
+
+
+def stream_gerber(source, filename, sx, sy, chunk_size=CHUNK_SIZE):
+    parser = GerberParser(source)
+    GerberExporter(sx, sy, filename, None).export_stream(parser.iter_commands(chunk_size))
+    return filename
@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon as MplPolygon
-from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc
+from matplotlib.collections import PolyCollection, LineCollection
+import numpy as np
+from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoInstanced, GeoFlashBatch
 from commands import FlashCommand, DrawCommand, RegionCommand, ArcCommand
 
 class CombinedGeometryPlotter:
@@ -34,6 +36,18 @@ class CombinedGeometryPlotter:
             last_pt = None
             color_temp=color
             for geom in geometries:
+                if isinstance(geom, GeoInstanced):
+                    draw_instanced(geom, color, linestyle, linewidth, label)
+                    label = None
+                    continue
+                if isinstance(geom, GeoFlashBatch):
+                    if geom.template is not None and len(geom.template):
+                        self.ax.add_collection(PolyCollection(
+                            geom.flashes(), closed=True, facecolors='none',
+                            edgecolors=color_dict.get(geom.aperture.shape, color),
+                            linestyles=linestyle, linewidths=linewidth, label=label))
+                        label = None
+                    continue
                 if isinstance(geom,GeoAperture):
                     
                     color=color_dict[geom.cmd.aperture.shape]
@@ -43,6 +57,13 @@ class CombinedGeometryPlotter:
                 if pts is None or len(pts) == 0:
                     continue
 
+                if getattr(geom, 'stroke', None) is not None:
+                    self.ax.add_collection(PolyCollection(
+                        geom.stroke, closed=True, facecolors='none', edgecolors=color,
+                        linestyles=linestyle, linewidths=linewidth, label=label))
+                    label = None
+                    continue
+
                 if isinstance(geom, (GeoAperture, GeoRegion)):
                     patch = MplPolygon(
                         pts, closed=True,
@@ -67,6 +88,28 @@ class CombinedGeometryPlotter:
                 label = None
                 last_pt = (pts[-1,0], pts[-1,1])
 
+        def draw_instanced(geom, color, linestyle, linewidth, label):
+            # the block is broadcast over the instance offsets only at render time
+            for inner in geom.geometries:
+                if inner.points is None or len(inner.points) == 0:
+                    continue
+                if getattr(inner, 'stroke', None) is not None:
+                    copies = inner.stroke[None] + geom.offsets[:, None, None, :]
+                    self.ax.add_collection(PolyCollection(
+                        copies.reshape(-1, *inner.stroke.shape[1:]), closed=True, facecolors='none',
+                        edgecolors=color, linestyles=linestyle, linewidths=linewidth, label=label))
+                    label = None
+                    continue
+                copies = geom.instances(inner)
+                if isinstance(inner, (GeoAperture, GeoRegion)):
+                    coll = PolyCollection(copies, closed=True, facecolors='none', edgecolors=color,
+                                          linestyles=linestyle, linewidths=linewidth, label=label)
+                else:
+                    coll = LineCollection(copies, colors=color, linestyles=linestyle,
+                                          linewidths=linewidth, label=label)
+                self.ax.add_collection(coll)
+                label = None
+
         
         draw(self.orig_geom,  color='grey', linestyle='-', linewidth=1.0, label='Original')
         
@@ -74,6 +117,12 @@ class CombinedGeometryPlotter:
 
         
         self.ax.relim()
+        # relim() ignores collections, so add their extents back
+        for geom in self.orig_geom + self.scaled_geom:
+            if isinstance(geom, (GeoInstanced, GeoFlashBatch)) or getattr(geom, 'stroke', None) is not None:
+                box = geom.bbox()
+                if box is not None:
+                    self.ax.update_datalim(box.reshape(2, 2))
         self.ax.autoscale_view()
         self.ax.legend(loc='upper right')
 
@@ -81,3 +130,78 @@ class CombinedGeometryPlotter:
         if plt.fignum_exists((8,8)):
 
             plt.show()
+
+
+class LivePreviewPlotter(CombinedGeometryPlotter):
+    # original layer is drawn once into a cached background; only the scaled
+    # collections are animated and blitted on top of it
+    def __init__(self, ax, canvas, render_dtype=np.float64):
+        super().__init__([], [], ax=ax)
+        self.canvas = canvas
+        self.render_dtype = render_dtype
+        self.background = None
+        self.closed_coll = None
+        self.open_coll = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def set_original(self, geometries):
+        self.orig_geom = geometries
+        self.scaled_geom = []
+        self.plot()
+        self.background = None
+        self.closed_coll = PolyCollection([], closed=True, facecolors='none', edgecolors='black',
+                                          linestyles='--', linewidths=0.5, animated=True)
+        self.open_coll = LineCollection([], colors='black', linestyles='--', linewidths=0.5, animated=True)
+        self.ax.add_collection(self.closed_coll, autolim=False)
+        self.ax.add_collection(self.open_coll, autolim=False)
+
+    def update_scaled(self, geometries):
+        self.scaled_geom = geometries
+        closed, lines = split_outlines(geometries, self.render_dtype)
+        self.closed_coll.set_verts(closed)
+        self.open_coll.set_segments(lines)
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def _on_draw(self, event):
+        # zoom, pan and resize redraw the static layer, so re-cache it
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for coll in (self.closed_coll, self.open_coll):
+            if coll is not None:
+                self.ax.draw_artist(coll)
+
+
+def split_outlines(geometries, dtype=np.float64):
+    # dtype=np.float32 gives half-size render buffers
+    closed, lines = [], []
+    for geom in geometries:
+        if isinstance(geom, GeoInstanced):
+            for inner in geom.geometries:
+                stroke = getattr(inner, 'stroke', None)
+                if stroke is not None:
+                    copies = (stroke[None] + geom.offsets[:, None, None, :]).reshape(-1, *stroke.shape[1:])
+                    closed.extend(copies.astype(dtype, copy=False))
+                elif inner.points is not None and len(inner.points):
+                    target = closed if isinstance(inner, (GeoAperture, GeoRegion)) else lines
+                    target.extend(geom.instances(inner).astype(dtype, copy=False))
+            continue
+        if isinstance(geom, GeoFlashBatch):
+            if geom.template is not None and len(geom.template):
+                closed.extend(geom.flashes().astype(dtype, copy=False))
+            continue
+        stroke = getattr(geom, 'stroke', None)
+        if stroke is not None:
+            closed.extend(stroke.astype(dtype, copy=False))
+            continue
+        pts = geom.points_as(dtype)
+        if pts is None or len(pts) == 0:
+            continue
+        (closed if isinstance(geom, (GeoAperture, GeoRegion)) else lines).append(pts)
+    return closed, lines
@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from parser import GerberParser
+from transformer import ScaleTransformer
+from geometry import geometries_bbox
+from metrics import compare
+from export_pipeline import GeometrySnapshot, EXPORTERS
+
+#Module for a local HTTP service that keeps parsed boards hot between calls
+
+EXTENSIONS = {'dxf': '.dxf', 'pdf': '.pdf', 'gerber': '.gbr', 'svg': '.svg', 'npz': '.npz'}
+CONTENT_TYPES = {'dxf': 'application/dxf', 'pdf': 'application/pdf',
+                 'gerber': 'application/vnd.gerber', 'svg': 'image/svg+xml'}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY = 1 << 30
+
+
+class LRUCache(OrderedDict):
+    # maxsize counts entries, or whatever sizeof measures, e.g. bytes
+    def __init__(self, maxsize, on_evict=None, sizeof=None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.sizeof = sizeof
+        self.size = 0
+
+    def _weight(self, value):
+        return 1 if self.sizeof is None else self.sizeof(value)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key, value):
+        self.discard(key)
+        weight = self._weight(value)
+        # something larger than the whole cache is handed back without being kept
+        if weight > self.maxsize:
+            return value
+        self[key] = value
+        self.size += weight
+        while self.size > self.maxsize:
+            old = next(iter(self))
+            self.discard(old)
+            if self.on_evict is not None:
+                self.on_evict(old)
+        return value
+
+    def discard(self, key):
+        if key in self:
+            self.size -= self._weight(super().pop(key))
+
+
+def _result_size(value):
+    # exports are kept as whole files; a JSON summary is counted as 1 KiB
+    return len(value) if isinstance(value, (bytes, bytearray)) else 1024
+
+
+# parsed boards of this worker; every digest is routed to one worker, so after the
+# upload only digests cross the process boundary
+_boards = LRUCache(16)
+
+
+def _init_worker(max_boards):
+    _boards.maxsize = max_boards
+
+
+def _ping():
+    return os.getpid()
+
+
+def _load_task(digest, data):
+    if digest not in _boards:
+        parser = GerberParser(data)
+        cmds = parser.run()
+        _boards.put(digest, (cmds, parser.apertures, parser.units))
+    return _describe_task(digest)
+
+
+def _forget_task(digest):
+    _boards.discard(digest)
+
+
+def _board(digest):
+    board = _boards.get(digest)
+    if board is None:
+        raise KeyError(f"unknown board {digest}")
+    return board
+
+
+def _transform(digest, sx, sy, stroke=False):
+    cmds, apertures, _ = _board(digest)
+    orig_geom, scaled_geom, _ = ScaleTransformer(sx, sy, stroke=stroke).apply(cmds, apertures)
+    return cmds, apertures, orig_geom, scaled_geom
+
+
+def _bbox(geometries):
+    box = geometries_bbox(geometries)
+    return None if box is None else [float(v) for v in box]
+
+
+def _describe_task(digest):
+    cmds, apertures, units = _board(digest)
+    _, _, orig_geom, _ = _transform(digest, 1.0, 1.0)
+    return {'id': digest, 'units': units, 'commands': len(cmds),
+            'apertures': len(apertures), 'bbox': _bbox(orig_geom)}
+
+
+def _scale_task(digest, sx, sy):
+    _, _, orig_geom, scaled_geom = _transform(digest, sx, sy)
+    return {'id': digest, 'sx': sx, 'sy': sy, 'features': len(scaled_geom),
+            'bbox_original': _bbox(orig_geom), 'bbox_scaled': _bbox(scaled_geom)}
+
+
+def _metrics_task(digest, sx, sy):
+    _, _, orig_geom, scaled_geom = _transform(digest, sx, sy)
+    report = compare(orig_geom, scaled_geom)
+    # per-feature arrays stay in the worker, the summary is what callers read
+    summary = {key: value for key, value in report.items() if not hasattr(value, 'shape')}
+    # NaN is not valid JSON, an undefined ratio goes out as null
+    summary = {key: (None if isinstance(value, float) and not math.isfinite(value) else value)
+               for key, value in summary.items()}
+    summary['features'] = len(report['index'])
+    summary.update(id=digest, sx=sx, sy=sy)
+    return summary
+
+
+def _export_task(digest, sx, sy, fmt, stroke):
+    cmds, apertures, orig_geom, scaled_geom = _transform(digest, sx, sy, stroke)
+    snapshot = GeometrySnapshot(scaled_geom, sx, sy, cmds, apertures)
+    fd, tmp = tempfile.mkstemp(suffix=EXTENSIONS.get(fmt, ''))
+    os.close(fd)
+    try:
+        EXPORTERS[fmt](snapshot, tmp)
+        with open(tmp, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(tmp)
+
+
+class ScalingService:
+    # each worker is its own single-process pool and owns the boards whose digest maps
+    # to it, so a board is parsed once and stays parsed; answers are memoized per
+    # (board, request), so a repeated call never reaches a worker
+    def __init__(self, max_workers=None, max_boards=16, max_result_bytes=256 << 20):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_boards = max_boards
+        # digests of the boards held by the workers; no raw bytes are kept here
+        self.boards = LRUCache(max_boards, on_evict=self._forget)
+        # answers, export files included, limited by their total size
+        self.results = LRUCache(max_result_bytes, sizeof=_result_size)
+        self.pools = []
+        self._pending = {}
+
+    async def start(self):
+        # a worker never holds more boards than the index, so it never drops one the index still lists
+        self.pools = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(self.max_boards,))
+                      for _ in range(self.max_workers)]
+        # start every worker now so the first request does not pay for the spawn and imports
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ping) for pool in self.pools))
+
+    def close(self):
+        for pool in self.pools:
+            pool.shutdown(cancel_futures=True)
+        self.pools = []
+
+    def _pool(self, digest):
+        if digest not in self.boards:
+            raise KeyError(f"unknown board {digest}")
+        self.boards.get(digest)
+        return self.pools[int(digest[:8], 16) % len(self.pools)]
+
+    def _forget(self, digest):
+        for key in [key for key in self.results if key[0] == digest]:
+            self.results.discard(key)
+        self.pools[int(digest[:8], 16) % len(self.pools)].submit(_forget_task, digest)
+
+    async def _cached(self, key, func, digest, *args):
+        if key in self.results:
+            return self.results.get(key)
+        fut = self._pending.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().run_in_executor(self._pool(digest), func, digest, *args)
+            self._pending[key] = fut
+            fut.add_done_callback(lambda f: self._settle(key, f))
+        # a dropped client must not cancel work other requests are waiting on
+        return await asyncio.shield(fut)
+
+    def _settle(self, key, fut):
+        self._pending.pop(key, None)
+        if not fut.cancelled() and fut.exception() is None and key[0] in self.boards:
+            self.results.put(key, fut.result())
+
+    async def add_board(self, data):
+        data = bytes(data)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.boards:
+            return await self.describe(digest)
+        self.boards.put(digest, True)
+        try:
+            # the only request that carries the board itself
+            return await self._cached((digest, 'describe'), _load_task, digest, data)
+        except BaseException:
+            # a board that did not load is not listed, so posting it again retries
+            self.boards.discard(digest)
+            self._forget(digest)
+            raise
+
+    async def describe(self, digest):
+        return await self._cached((digest, 'describe'), _describe_task, digest)
+
+    async def scale(self, digest, sx, sy):
+        return await self._cached((digest, 'scale', sx, sy), _scale_task, digest, sx, sy)
+
+    async def metrics(self, digest, sx, sy):
+        return await self._cached((digest, 'metrics', sx, sy), _metrics_task, digest, sx, sy)
+
+    async def export(self, digest, fmt, sx, sy, stroke=False):
+        if fmt not in EXPORTERS:
+            raise ValueError(f"no exporter for: {fmt}")
+        return await self._cached((digest, 'export', fmt, sx, sy, stroke), _export_task, digest,
+                                  sx, sy, fmt, stroke)
+
+    async def route(self, method, target, body):
+        # POST /boards, GET /boards/<id>, GET /boards/<id>/scale|metrics?sx=&sy=,
+        # GET /boards/<id>/export/<fmt>?sx=&sy=&stroke=1
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        if parts == ['boards']:
+            if method != 'POST':
+                return 405, 'application/json', {'error': 'POST a gerber file to /boards'}
+            return 200, 'application/json', await self.add_board(body)
+        if len(parts) < 2 or parts[0] != 'boards' or method != 'GET':
+            return 404, 'application/json', {'error': f"no route for {method} {url.path}"}
+        digest, action = parts[1], parts[2:]
+        sx = float(query.get('sx', 1.0))
+        sy = float(query.get('sy', sx))
+        if not action:
+            return 200, 'application/json', await self.describe(digest)
+        if action == ['scale']:
+            return 200, 'application/json', await self.scale(digest, sx, sy)
+        if action == ['metrics']:
+            return 200, 'application/json', await self.metrics(digest, sx, sy)
+        if len(action) == 2 and action[0] == 'export':
+            stroke = query.get('stroke', '0').lower() in ('1', 'true', 'yes')
+            body = await self.export(digest, action[1], sx, sy, stroke)
+            return 200, CONTENT_TYPES.get(action[1], 'application/octet-stream'), body
+        return 404, 'application/json', {'error': f"no route for {method} {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, ctype, payload = await self.route(method, target, body)
+                except KeyError as e:
+                    status, ctype, payload = 404, 'application/json', {'error': str(e.args[0])}
+                except ValueError as e:
+                    status, ctype, payload = 400, 'application/json', {'error': str(e)}
+                except Exception as e:
+                    status, ctype, payload = 500, 'application/json', {'error': f"{type(e).__name__}: {e}"}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_response(status, ctype, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            # malformed request line or oversized body, the stream cannot be trusted further
+            writer.write(_response(400, 'application/json', {'error': str(e)}, False))
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+def _response(status, ctype, payload, keep_alive=True):
+    if not isinstance(payload, (bytes, bytearray)):
+        payload = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + bytes(payload)
+
+
+async def serve(host='127.0.0.1', port=8765, unix_path=None, max_workers=None, max_boards=16,
+                max_result_bytes=256 << 20):
+    service = ScalingService(max_workers, max_boards, max_result_bytes)
+    await service.start()
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle, path=unix_path)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    where = unix_path or f"http://{host}:{port}"
+    print(f"gerbertool service listening on {where} with {service.max_workers} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve gerber scaling, metrics and export over HTTP")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--unix', help="listen on a unix socket instead of tcp")
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--boards', type=int, default=16, help="parsed boards kept in memory")
+    ap.add_argument('--cache-mb', type=int, default=256, help="memory for cached answers and exports")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.boards, args.cache_mb << 20))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from commands import FlashCommand, RegionCommand, DrawCommand, ArcCommand
+from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoFlashBatch
+from arcs import arc_vertex_counts
+from transformer import ScaleTransformer
+
+#Module for tessellating and scaling a layer in worker processes through shared memory
+
+GEOMETRY_TYPES = {FlashCommand: GeoAperture, RegionCommand: GeoRegion,
+                  DrawCommand: GeoDraw, ArcCommand: GeoArc}
+
+
+def vertex_counts(cmds):
+    # vertices each command tessellates to, known before any worker runs
+    counts = np.zeros(len(cmds), dtype=np.int64)
+    templates = {}
+    arcs = []
+    for k, cmd in enumerate(cmds):
+        if isinstance(cmd, FlashCommand):
+            n = templates.get(cmd.aperture)
+            if n is None:
+                n = templates[cmd.aperture] = len(GeoAperture(cmd).command_to_geometry())
+            counts[k] = n
+        elif isinstance(cmd, RegionCommand):
+            counts[k] = len(cmd.polygon)
+        elif isinstance(cmd, DrawCommand):
+            counts[k] = len(cmd.path)
+        elif isinstance(cmd, ArcCommand):
+            arcs.append(k)
+    if arcs:
+        geoms = [GeoArc(cmds[k]) for k in arcs]
+        counts[arcs] = arc_vertex_counts([g.start for g in geoms], [g.end for g in geoms],
+                                         [g.center for g in geoms], [g.clockwise for g in geoms])
+    return counts
+
+
+def partition(counts, parts):
+    # contiguous command ranges holding about the same number of vertices
+    total = np.cumsum(counts)
+    if len(total) == 0:
+        return []
+    cuts = np.searchsorted(total, total[-1] * np.arange(1, parts) / parts, side='right')
+    bounds = np.unique(np.concatenate([[0], cuts, [len(counts)]]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _tessellate_part(name, total, cmds, offsets, sx, sy, scale, resolution=None, coord_dtype=np.int64):
+    # runs in a worker: writes original and scaled vertices at the precomputed offsets
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buf = np.ndarray((2, total, 2), dtype=np.float64, buffer=shm.buf)
+        transformer = ScaleTransformer(sx, sy, batch_flashes=False, resolution=resolution,
+                                       coord_dtype=coord_dtype)
+        original = transformer._build(cmds)
+        transformer._fix(original)
+        scaled = transformer.scale(original) if scale else ()
+        for geom, lo, hi in zip(original, offsets[:-1], offsets[1:]):
+            buf[0, lo:hi] = geom.points
+        for geom, lo, hi in zip(scaled, offsets[:-1], offsets[1:]):
+            buf[1, lo:hi] = geom.points
+        del buf
+    finally:
+        shm.close()
+    return len(cmds)
+
+
+class SharedMemoryTessellator:
+    # same result as ScaleTransformer.apply, with the per-geometry outline work spread
+    # over processes. Flashes are batched and step-and-repeat blocks built here, as
+    # _build does, so only regions, draws and arcs go to the workers. Their vertices
+    # come back as views of one shared segment, not pickles, and stay views until
+    # close(), which copies them out and releases the segment
+    def __init__(self, transformer, max_workers=None, parts_per_worker=2, min_commands=2000):
+        self.transformer = transformer
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parts_per_worker = parts_per_worker
+        # below this many per-geometry commands the processes cost more than they save
+        self.min_commands = min_commands
+        self.segment = None
+        self.vertices = None
+        self.offsets = None
+        self._shared = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # every numpy view of the segment has to be gone before SharedMemory.close()
+        for geom in self._shared:
+            geom.points = np.array(geom.points)
+        self._shared = []
+        self.vertices = None
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def apply(self, original_cmds, original_apertures=None):
+        tr = self.transformer
+        types = set(GEOMETRY_TYPES)
+        if tr.batch_flashes:
+            types.discard(FlashCommand)
+        cmds = [cmd for cmd in original_cmds if type(cmd) in types]
+        if len(cmds) < self.min_commands:
+            return tr.apply(original_cmds, original_apertures)
+        counts = vertex_counts(cmds)
+        offsets = np.zeros(len(cmds) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        total = int(offsets[-1])
+
+        # the offset engine can change vertex counts, so the parent scales those itself
+        in_workers = tr.method == 'normal'
+        self.close()
+        self.segment = shared_memory.SharedMemory(create=True, size=max(total, 1) * 4 * 8)
+        try:
+            self.vertices = np.ndarray((2, total, 2), dtype=np.float64, buffer=self.segment.buf)
+            ranges = partition(counts, self.max_workers * self.parts_per_worker)
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [pool.submit(_tessellate_part, self.segment.name, total, cmds[lo:hi],
+                                       offsets[lo:hi + 1], tr.sx, tr.sy, in_workers, tr.resolution,
+                                       tr.coord_dtype)
+                           for lo, hi in ranges]
+                for fut in futures:
+                    fut.result()
+        finally:
+            # the name is gone at once; the mapping lives on for the views below
+            self.segment.unlink()
+        self.offsets = offsets
+
+        shared = iter(self._views(cmds, 0))
+        original_geometries = []
+        built_here = set()
+        # aperture -> (list position of its batch, flash centers), as in _build
+        flashes = {}
+        for cmd in original_cmds:
+            if type(cmd) in types:
+                original_geometries.append(next(shared))
+            elif isinstance(cmd, FlashCommand):
+                if cmd.aperture not in flashes:
+                    flashes[cmd.aperture] = (len(original_geometries), [])
+                    built_here.add(len(original_geometries))
+                    original_geometries.append(None)
+                flashes[cmd.aperture][1].append((cmd.x, cmd.y))
+            else:
+                # step-and-repeat blocks are stored once, so they are built in the parent
+                for geom in tr._build([cmd]):
+                    built_here.add(len(original_geometries))
+                    original_geometries.append(geom)
+        for aperture, (pos, centers) in flashes.items():
+            geom = GeoFlashBatch(aperture, centers)
+            geom.command_to_geometry()
+            original_geometries[pos] = geom
+        # on a grid the views are replaced by integer copies, exactly as apply() stores them
+        self._fix(original_geometries)
+        if tr.stroke:
+            tr._stroke(original_geometries, 1.0, 1.0)
+
+        if not in_workers:
+            return original_geometries, tr.scale(original_geometries), {}
+        if not (tr.sx != 1 and tr.sy != 1):
+            return original_geometries, original_geometries, {}
+        shared = iter(self._views(cmds, 1))
+        scaled_geometries = []
+        for k, geom in enumerate(original_geometries):
+            if k in built_here:
+                geom = geom.clone()
+                geom.scale_geometry(tr.sx, tr.sy)
+            else:
+                geom = next(shared)
+            scaled_geometries.append(geom)
+        self._fix(scaled_geometries)
+        if tr.stroke:
+            tr._stroke(scaled_geometries, tr.sx, tr.sy)
+        return original_geometries, scaled_geometries, {}
+
+    def _fix(self, geometries):
+        tr = self.transformer
+        if tr.resolution is None:
+            return
+        tr._fix(geometries)
+        self._shared = []
+
+    def _views(self, cmds, layer):
+        # light geometry objects whose points are slices of the shared buffer
+        vertices = self.vertices[layer]
+        for cmd, lo, hi in zip(cmds, self.offsets[:-1], self.offsets[1:]):
+            geom = GEOMETRY_TYPES[type(cmd)](cmd)
+            geom.points = vertices[lo:hi]
+            self._shared.append(geom)
+            yield geom
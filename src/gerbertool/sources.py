@@ -0,0 +1,120 @@
+import codecs
+import io
+import os
+import zipfile
+import zlib
+from functools import partial
+
+#Module for reading gerber data from paths, gzip files, zip members, bytes and streams
+
+GZIP_MAGIC = b'\x1f\x8b'
+CHUNK_SIZE = 1 << 16
+GERBER_EXTENSIONS = ('.gbr', '.ger', '.gtl', '.gbl', '.gts', '.gbs', '.gto', '.gbo',
+                     '.gtp', '.gbp', '.gko', '.gm1', '.g1', '.g2', '.g3', '.g4', '.art', '.pho')
+
+
+class ArchiveMember:
+    def __init__(self, archive, name):
+        self.archive = os.fspath(archive) if isinstance(archive, (str, os.PathLike)) else archive
+        self.name = name
+
+    def open(self):
+        # the member keeps the archive file open until it is closed itself
+        with zipfile.ZipFile(self.archive) as zf:
+            return zf.open(self.name)
+
+    def __repr__(self):
+        return f"ArchiveMember({self.archive!r}, {self.name!r})"
+
+
+def is_gerber_name(name):
+    name = name.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return name.endswith(GERBER_EXTENSIONS)
+
+
+def zip_members(archive):
+    with zipfile.ZipFile(archive) as zf:
+        names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    return [ArchiveMember(archive, name) for name in names if is_gerber_name(name)]
+
+
+def source_name(source):
+    if isinstance(source, ArchiveMember):
+        return source.name
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(os.fspath(source))
+    return getattr(source, 'name', '<stream>')
+
+
+def open_binary(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, ArchiveMember):
+        return source.open()
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    return source
+
+
+def _gunzip(chunks):
+    dec = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            out = dec.decompress(chunk)
+            if out:
+                yield out
+            # concatenated gzip members start over with a fresh decompressor
+            chunk = dec.unused_data
+            if dec.eof:
+                dec = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = b''
+    tail = dec.flush()
+    if tail:
+        yield tail
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    stream = open_binary(source)
+    try:
+        first = stream.read(chunk_size)
+        rest = iter(partial(stream.read, chunk_size), first[:0])
+        if isinstance(first, bytes) and first[:2] == GZIP_MAGIC:
+            yield from _gunzip(_prepend(first, rest))
+        else:
+            yield from _prepend(first, rest)
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def _prepend(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def iter_text_chunks(source, chunk_size=CHUNK_SIZE, encoding='utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in iter_chunks(source, chunk_size):
+        if isinstance(chunk, str):
+            yield chunk
+            continue
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(source, chunk_size=CHUNK_SIZE):
+    pending = ''
+    for chunk in iter_text_chunks(source, chunk_size):
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
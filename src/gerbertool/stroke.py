@@ -0,0 +1,64 @@
+import numpy as np
+
+#Module for turning trace centerlines into width-aware outlines
+
+
+def pen_outline(aperture, arc_points=32):
+    # convex counter-clockwise outline of the aperture at the origin
+    shape = aperture.shape
+    params = list(aperture.params)
+    if shape == 'R' and len(params) >= 2:
+        w, h = params[:2]
+        return np.array([[-w/2, -h/2], [w/2, -h/2], [w/2, h/2], [-w/2, h/2]])
+    if shape in ('O', 'E') and len(params) >= 2:
+        rx, ry = params[0] / 2, params[1] / 2
+    else:
+        rx = ry = (params[0] / 2) if params else 0.0
+    angles = np.linspace(0, 2*np.pi, arc_points, endpoint=False)
+    return np.column_stack([rx*np.cos(angles), ry*np.sin(angles)])
+
+
+def path_segments(points):
+    pts = np.asarray(points, dtype=float)
+    if len(pts) < 2:
+        return np.repeat(pts[:, None, :], 2, axis=1)
+    return np.stack([pts[:-1], pts[1:]], axis=1)
+
+
+def stroke_segments(segments, pen):
+    # Minkowski sum of every segment with a convex pen in one pass: each pen edge
+    # facing along the segment is placed at its end, the others at its start
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    pen = np.asarray(pen, dtype=float)
+    a = segments[:, 0, None, :]
+    b = segments[:, 1, None, :]
+    d = segments[:, 1] - segments[:, 0]
+    edges = np.roll(pen, -1, axis=0) - pen
+    normals = np.column_stack([edges[:, 1], -edges[:, 0]])
+    use_b = (d @ normals.T) > 0
+    prev_b = np.roll(use_b, 1, axis=1)
+    first = np.where(prev_b[:, :, None], b, a) + pen
+    second = np.where(use_b[:, :, None], b, a) + pen
+    return np.stack([first, second], axis=2).reshape(len(segments), 2 * len(pen), 2)
+
+
+def stroke_geometries(geometries, scale_x=1.0, scale_y=1.0, arc_points=32):
+    # all segments drawn with the same aperture are packed into one (N, 2, 2) array
+    groups = {}
+    for geom in geometries:
+        pts = getattr(geom, 'points', None)
+        aperture = getattr(geom, 'aperture', None)
+        if aperture is None or pts is None or len(pts) == 0:
+            continue
+        groups.setdefault(id(aperture), (aperture, []))[1].append(geom)
+
+    for aperture, members in groups.values():
+        if (scale_x, scale_y) != (1, 1):
+            aperture = aperture.scale(scale_x, scale_y)
+        pen = pen_outline(aperture, arc_points)
+        segs = [path_segments(g.points) for g in members]
+        outlines = stroke_segments(np.concatenate(segs), pen)
+        start = 0
+        for geom, seg in zip(members, segs):
+            geom.stroke = outlines[start:start + len(seg)]
+            start += len(seg)
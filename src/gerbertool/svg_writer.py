@@ -0,0 +1,158 @@
+from xml.sax.saxutils import escape
+import numpy as np
+from geometry import GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoInstanced, GeoFlashBatch, geometries_bbox
+from transformer import ScaleTransformer
+
+#Module for writing scaled geometry as SVG for browser review
+
+MARGIN = 1.0
+# room under the layer for a label
+LABEL_SPACE = 4.0
+
+
+class SVGWriter:
+    # writes features as they come; every distinct flash outline and every
+    # step-and-repeat block is defined once and placed with <use>
+    def __init__(self, filename, bbox, precision=4, batch_size=4096, buffer_size=1 << 20, label=None,
+                 scale=(1.0, 1.0)):
+        self.filename = filename
+        self.bbox = np.asarray(bbox, dtype=float)
+        # factors the geometry was scaled by; unstroked traces take their width from
+        # the aperture scaled the same way
+        self.sx, self.sy = (float(v) for v in scale)
+        self.precision = precision
+        self.label = label
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self._num = f"%.{precision}f"
+        self._symbols = {}
+        self._blocks = 0
+        self._f = None
+
+    def __enter__(self):
+        x0, y0, x1, y1 = self.bbox + np.array([-MARGIN, -MARGIN, MARGIN, MARGIN])
+        if self.label:
+            y0 -= LABEL_SPACE
+        w, h = x1 - x0, y1 - y0
+        self._f = open(self.filename, 'w', buffering=self.buffer_size, newline='\n')
+        n = self._num
+        # gerber y points up, so the drawing is flipped inside one group
+        self._f.write(('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       f'<svg xmlns="http://www.w3.org/2000/svg" width="{n}mm" height="{n}mm" '
+                       f'viewBox="{n} {n} {n} {n}">\n'
+                       '<rect x="%s" y="%s" width="%s" height="%s" fill="white"/>\n'
+                       '<g transform="scale(1 -1)" fill="black" stroke="none">\n')
+                      % (w, h, x0, -y1, w, h, n % x0, n % -y1, n % w, n % h))
+        return self
+
+    def __exit__(self, *exc):
+        self._f.write('</g>\n')
+        if self.label:
+            # written outside the flipped group so the text reads upright
+            x, y = self.bbox[0], -self.bbox[1] + LABEL_SPACE - MARGIN
+            self._f.write(f'<text x="{self._num}" y="{self._num}" font-size="2.5" font-family="monospace">%s</text>\n'
+                          % (x, y, escape(self.label)))
+        self._f.write('</svg>\n')
+        self._f.close()
+        self._f = None
+
+    def write(self, geometries):
+        for geom in geometries:
+            if isinstance(geom, GeoInstanced):
+                self._write_instanced(geom)
+            elif isinstance(geom, GeoFlashBatch):
+                if geom.template is not None and len(geom.template):
+                    self._write_uses(self._symbol(geom.template), geom.centers)
+            elif isinstance(geom, GeoAperture):
+                if geom.points is not None and len(geom.points):
+                    self._write_uses(self._symbol(geom.points - geom.center), geom.center[None])
+            else:
+                self._f.write(self._feature(geom))
+
+    def _symbol(self, outline):
+        # identical outlines share one <defs> entry, keyed by their formatted path
+        d = self._path(outline, True)
+        ref = self._symbols.get(d)
+        if ref is None:
+            ref = self._symbols[d] = f"a{len(self._symbols)}"
+            self._f.write(f'<defs><path id="{ref}" d="{d}"/></defs>\n')
+        return ref
+
+    def _write_uses(self, ref, centers):
+        line = f'<use href="#{ref}" x="{self._num}" y="{self._num}"/>\n'
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        for start in range(0, len(centers), self.batch_size):
+            chunk = centers[start:start + self.batch_size]
+            self._f.write((line * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+    def _write_instanced(self, geom):
+        ref = f"sr{self._blocks}"
+        self._blocks += 1
+        self._f.write(f'<defs><g id="{ref}">\n')
+        self.write(geom.geometries)
+        self._f.write('</g></defs>\n')
+        self._write_uses(ref, geom.offsets)
+
+    def _feature(self, geom):
+        stroke = getattr(geom, 'stroke', None)
+        if stroke is not None:
+            # stroked traces are unions of closed outlines, one path holds them all
+            d = ''.join(self._path(outline, True) for outline in stroke)
+            return f'<path d="{d}"/>\n'
+        pts = geom.points
+        if pts is None or len(pts) == 0:
+            return ''
+        if isinstance(geom, GeoRegion):
+            return f'<path d="{self._path(pts, True)}"/>\n'
+        if isinstance(geom, (GeoDraw, GeoArc)):
+            # plain centerlines are drawn with the aperture size as line width
+            aperture = geom.aperture
+            if aperture is not None and self.sx != 1 and self.sy != 1:
+                aperture = aperture.scale(self.sx, self.sy)
+            width = self._num % _line_width(aperture)
+            return (f'<path d="{self._path(pts, False)}" fill="none" stroke="black" '
+                    f'stroke-width="{width}" stroke-linecap="round" stroke-linejoin="round"/>\n')
+        return f'<path d="{self._path(pts, True)}"/>\n'
+
+    def _path(self, pts, closed):
+        # one %-template per point count formats the whole array in a single call
+        pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+        n = self._num
+        fmt = f"M{n} {n}" + f" {n} {n}" * (len(pts) - 1) + ("Z" if closed else "")
+        return fmt % tuple(pts.ravel().tolist())
+
+
+def _line_width(aperture):
+    params = list(getattr(aperture, 'params', ()) or ())
+    if not params:
+        return 0.0
+    if aperture.shape in ('R', 'O') and len(params) >= 2:
+        return min(params[:2])
+    return params[0]
+
+
+class SVGExporter:
+
+    def __init__(self, scale_x, scale_y, filename, commands, stroke=False, geometries=None,
+                 precision=4, label=None):
+        self.sx = float(scale_x)
+        self.sy = float(scale_y)
+        self.filename = filename
+        self.commands = commands
+        self.stroke = stroke
+        # already scaled geometry, e.g. from an export snapshot, skips the transform
+        self.geometries = geometries
+        self.precision = precision
+        self.label = label
+
+    def export(self):
+        scaled_geoms = self.geometries
+        if scaled_geoms is None:
+            transformer = ScaleTransformer(self.sx, self.sy, stroke=self.stroke)
+            _, scaled_geoms, _ = transformer.apply(self.commands, {})
+        box = geometries_bbox(scaled_geoms)
+        if box is None:
+            box = np.zeros(4)
+        with SVGWriter(self.filename, box, self.precision, label=self.label, scale=(self.sx, self.sy)) as writer:
+            writer.write(scaled_geoms)
+        print(f"SVG saved to {self.filename}")
@@ -0,0 +1,193 @@
+import argparse
+import copy
+import os
+import numpy as np
+from parser import GerberParser
+from transformer import ScaleTransformer
+from geometry import GeoInstanced, GeoFlashBatch
+from offset import offset_contour_variants
+from exporter import DXFExporter, PdfRenderer
+from svg_writer import SVGExporter
+from gerber_writer import GerberExporter
+from interchange import write_npz
+
+#Module for producing one layer at many scale factor pairs from a single parse
+
+EXTENSIONS = {'dxf': '.dxf', 'pdf': '.pdf', 'svg': '.svg', 'gerber': '.gbr', 'npz': '.npz'}
+
+
+def scale_grid(sx_values, sy_values):
+    # every (sx, sy) combination as an (N, 2) array, sx varying slowest
+    sx, sy = np.meshgrid(np.asarray(sx_values, dtype=float), np.asarray(sy_values, dtype=float), indexing='ij')
+    return np.column_stack([sx.ravel(), sy.ravel()])
+
+
+def _leaves(geometries):
+    # the geometries that own points, in the order _replace hands points back
+    for geom in geometries:
+        if isinstance(geom, GeoInstanced):
+            yield from _leaves(geom.geometries)
+        elif isinstance(geom, GeoFlashBatch):
+            yield geom.outline
+        else:
+            yield geom
+
+
+def _replace(geometries, points):
+    # shallow copies that share everything with the original except their points
+    result = []
+    for geom in geometries:
+        clone = copy.copy(geom)
+        if isinstance(geom, GeoInstanced):
+            clone.geometries = _replace(geom.geometries, points)
+        elif isinstance(geom, GeoFlashBatch):
+            clone.outline = _replace([geom.outline], points)[0]
+        else:
+            clone.points = next(points)
+        result.append(clone)
+    return result
+
+
+def growth_basis(geom):
+    # scale_geometry moves each vertex along a fixed direction by (s - 1) per axis,
+    # so one probe at s = 2 gives the direction for every factor
+    pts = np.asarray(geom.points, dtype=float)
+    probe = copy.copy(geom)
+    probe.scale_geometry(2.0, 2.0)
+    return np.asarray(probe.points, dtype=float) - pts
+
+
+class LinearScaler:
+    # the normal method for one layer at any factor pair, as base + (s - 1) * basis with
+    # the basis worked out once; used where the factors change often, e.g. a live preview
+    def __init__(self, geometries):
+        self.geometries = geometries
+        self.leaves = []
+        for leaf in _leaves(geometries):
+            pts = leaf.points
+            if pts is None or len(pts) == 0:
+                self.leaves.append((pts, None))
+                continue
+            basis = growth_basis(leaf)
+            self.leaves.append((pts, basis if basis.any() else None))
+
+    def scale(self, sx, sy):
+        # same condition as ScaleTransformer.scale
+        if not (sx != 1 and sy != 1):
+            return self.geometries
+        growth = np.array([sx - 1, sy - 1])
+        return _replace(self.geometries, (pts if basis is None else pts + basis * growth
+                                          for pts, basis in self.leaves))
+
+
+class ScaleSweep:
+    # parses and tessellates once, then moves every vertex for all pairs at once along
+    # a leading variant axis; variant k matches ScaleTransformer(*pairs[k]).apply()
+    def __init__(self, pairs, stroke=False, method='normal', join='miter', miter_limit=2.0):
+        self.pairs = np.asarray(pairs, dtype=float).reshape(-1, 2)
+        self.transformer = ScaleTransformer(1.0, 1.0, stroke=stroke, method=method,
+                                            join=join, miter_limit=miter_limit)
+
+    def apply(self, original_cmds):
+        tr = self.transformer
+        original_geometries = tr._build(original_cmds)
+        if tr.stroke:
+            tr._stroke(original_geometries, 1.0, 1.0)
+
+        # the transformer leaves a layer alone unless both factors differ from 1
+        active = (self.pairs[:, 0] != 1) & (self.pairs[:, 1] != 1)
+        growth = np.where(active[:, None], self.pairs - 1, 0.0)
+        stacks = [self._sweep_points(leaf, growth) for leaf in _leaves(original_geometries)]
+
+        variants = []
+        for k, (sx, sy) in enumerate(self.pairs):
+            if not active[k]:
+                variants.append(original_geometries)
+                continue
+            geometries = _replace(original_geometries, (stack[k] for stack in stacks))
+            if tr.stroke:
+                tr._stroke(geometries, sx, sy)
+            variants.append(geometries)
+        return original_geometries, variants
+
+    def _sweep_points(self, geom, growth):
+        # (V, K, 2) points of one geometry for every variant, or a list when the
+        # offset engine gives the variants different vertex counts
+        pts = geom.points
+        count = len(growth)
+        if pts is None or len(pts) == 0:
+            return [pts] * count
+        tr = self.transformer
+        if tr.method == 'offset':
+            if not geom.closed or len(pts) < 3:
+                return [pts] * count
+            return offset_contour_variants(pts, growth[:, 0], growth[:, 1], tr.join, tr.miter_limit)
+        basis = growth_basis(geom)
+        if not basis.any():
+            return [pts] * count
+        return pts[None, :, :] + basis[None, :, :] * growth[:, None, :]
+
+
+def variant_name(pattern, sx, sy, fmt):
+    return pattern.format(sx=sx, sy=sy) + EXTENSIONS[fmt]
+
+
+def export_variants(variants, pairs, pattern, formats=('dxf',), stamp=False, commands=(), apertures=None):
+    # pattern is a path with {sx} and {sy} fields, e.g. "out/top_{sx:.4f}_{sy:.4f}"
+    written = []
+    for geometries, (sx, sy) in zip(variants, pairs):
+        label = f"sx={sx:.6g} sy={sy:.6g}" if stamp else None
+        for fmt in formats:
+            filename = variant_name(pattern, sx, sy, fmt)
+            if fmt == 'dxf':
+                DXFExporter(sx, sy, filename, commands, geometries=geometries, label=label).export()
+            elif fmt == 'pdf':
+                PdfRenderer(geometries, label=label).export_scaled_geometry_to_pdf(filename)
+            elif fmt == 'svg':
+                SVGExporter(sx, sy, filename, commands, geometries=geometries, label=label).export()
+            elif fmt == 'gerber':
+                # the gerber writer scales apertures from the commands, not from geometry
+                GerberExporter(sx, sy, filename, commands, apertures).export()
+            elif fmt == 'npz':
+                write_npz(filename, geometries, sx, sy)
+            else:
+                raise ValueError(f"no exporter for: {fmt}")
+            written.append(filename)
+    return written
+
+
+def sweep_file(source, pairs, pattern, formats=('dxf',), stamp=False, stroke=False, method='normal'):
+    parser = GerberParser(source)
+    cmds = parser.run()
+    sweep = ScaleSweep(pairs, stroke=stroke, method=method)
+    _, variants = sweep.apply(cmds)
+    return export_variants(variants, sweep.pairs, pattern, formats, stamp, cmds, parser.apertures)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Write one gerber layer at several scale factor pairs")
+    ap.add_argument('source')
+    ap.add_argument('--sx', type=float, nargs='+', required=True)
+    ap.add_argument('--sy', type=float, nargs='+', help="defaults to the --sx values")
+    ap.add_argument('--grid', action='store_true', help="every sx with every sy instead of pairwise")
+    ap.add_argument('--format', dest='formats', nargs='+', default=['dxf'], choices=sorted(EXTENSIONS))
+    ap.add_argument('--out', default=None, help="output pattern with {sx} and {sy} fields")
+    ap.add_argument('--stamp', action='store_true', help="write the factors onto every output")
+    ap.add_argument('--stroke', action='store_true')
+    ap.add_argument('--method', default='normal', choices=('normal', 'offset'))
+    args = ap.parse_args(argv)
+
+    sy = args.sy or args.sx
+    if args.grid:
+        pairs = scale_grid(args.sx, sy)
+    elif len(sy) != len(args.sx):
+        ap.error("--sx and --sy need the same number of values unless --grid is given")
+    else:
+        pairs = np.column_stack([args.sx, sy])
+    pattern = args.out or os.path.splitext(os.path.basename(args.source))[0] + "_{sx:.4f}_{sy:.4f}"
+    for filename in sweep_file(args.source, pairs, pattern, args.formats, args.stamp, args.stroke, args.method):
+        print(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,134 @@
-from commands import GerberCommand, FlashCommand,RegionCommand,DrawCommand, ArcCommand
+import numpy as np
+from commands import GerberCommand, FlashCommand,RegionCommand,DrawCommand, ArcCommand, StepRepeatCommand
 from apertures import ApertureDefinition
-from geometry import Geometry, GeoAperture, GeoRegion, GeoDraw, GeoArc
+from geometry import Geometry, GeoAperture, GeoRegion, GeoDraw, GeoArc, GeoInstanced, GeoFlashBatch
+from stroke import stroke_geometries
+from arcs import tessellate_geometries
 class ScaleTransformer:
-    def __init__(self, sx, sy):
+    def __init__(self, sx, sy, stroke=False, method='normal', join='miter', miter_limit=2.0,
+                 batch_flashes=True, resolution=None, coord_dtype=np.int64):
         self.sx, self.sy = sx, sy
+        # stroke=True gives draws and arcs aperture-width outlines in geom.stroke
+        self.stroke = stroke
+        # method='offset' grows closed outlines with the vectorized offset engine
+        if method not in ('normal', 'offset'):
+            raise ValueError(f"Unknown scaling method: {method}")
+        self.method = method
+        self.join = join
+        self.miter_limit = miter_limit
+        # batch_flashes=True collects the flashes of each aperture into one GeoFlashBatch
+        self.batch_flashes = batch_flashes
+        # resolution (mm, e.g. fixed.NANOMETRE) quantises every result to that grid
+        self.resolution = resolution
+        self.coord_dtype = coord_dtype
 
     def apply(self,
               original_cmds,
               original_apertures
              ):
-        original_geometries=[]
-        for cmd in original_cmds:
-            if isinstance(cmd, FlashCommand):
-                geom = GeoAperture(cmd)
-            elif isinstance(cmd, RegionCommand):
-                geom = GeoRegion(cmd)
-            elif isinstance(cmd, DrawCommand):
-                geom = GeoDraw(cmd)
-            elif isinstance(cmd, ArcCommand):
-                geom = GeoArc(cmd, last_pt)
-            else:
-                continue
-            geom.command_to_geometry()
-           
-           
-            original_geometries.append(geom)
+        original_geometries = self._build(original_cmds)
+        self._fix(original_geometries)
+        if self.stroke:
+            self._stroke(original_geometries, 1.0, 1.0)
 
         scaled_apts = {
         
         }
+        scaled_geometries = self.scale(original_geometries)
+        return original_geometries, scaled_geometries, scaled_apts
+
+    def apply_drills(self, drills):
+        # excellon data from DrillData: hits are one flash batch per tool and keep their
+        # position like pads; slots and routes are always stroked with the tool diameter
+        original_geometries = drills.geometries()
+        for geom in original_geometries:
+            geom.command_to_geometry()
+        self._fix(original_geometries)
+        self._stroke(original_geometries, 1.0, 1.0)
+        scaled_geometries = self.scale(original_geometries)
+        if scaled_geometries is not original_geometries and not self.stroke:
+            self._stroke(scaled_geometries, self.sx, self.sy)
+        return original_geometries, scaled_geometries
+
+    def iter_apply(self, command_chunks):
+        # streaming counterpart of apply: each chunk is built, scaled and handed on
+        # before the next one is read
+        for cmds in command_chunks:
+            original_geometries = self._build(cmds)
+            self._fix(original_geometries)
+            if self.stroke:
+                self._stroke(original_geometries, 1.0, 1.0)
+            yield original_geometries, self.scale(original_geometries)
+
+    def scale(self, original_geometries):
+        # rescales already tessellated geometry, e.g. for a live preview
         scaled_geometries = []
                 
         if self.sx!=1 and self.sy!=1:
             for geom in original_geometries:
                 geom_scaled = geom.clone()
-                geom_scaled.scale_geometry(self.sx, self.sy)
+                if self.method == 'offset':
+                    geom_scaled.offset_geometry(self.sx, self.sy, self.join, self.miter_limit)
+                else:
+                    geom_scaled.scale_geometry(self.sx, self.sy)
                 scaled_geometries.append(geom_scaled)
         else:
             scaled_geometries=original_geometries    
-        return original_geometries, scaled_geometries, scaled_apts
+
+        if self.stroke and scaled_geometries is not original_geometries:
+            self._stroke(scaled_geometries, self.sx, self.sy)
+        return scaled_geometries
+
+    def _fix(self, geometries):
+        if self.resolution is None:
+            return
+        for geom in geometries:
+            geom.set_resolution(self.resolution, self.coord_dtype)
+
+    def _stroke(self, geometries, sx, sy):
+        stroke_geometries(geometries, sx, sy)
+        for geom in geometries:
+            if isinstance(geom, GeoInstanced):
+                stroke_geometries(geom.geometries, sx, sy)
+
+    def _build(self, cmds, batch=None):
+        if batch is None:
+            batch = self.batch_flashes
+        geometries = []
+        arcs = []
+        # aperture -> (list position of its batch, flash centers)
+        flashes = {}
+        for cmd in cmds:
+            if isinstance(cmd, StepRepeatCommand):
+                # the block is stored once already, its flashes stay individual
+                geometries.append(GeoInstanced(self._build(cmd.commands, batch=False), cmd.offsets))
+                continue
+            if isinstance(cmd, FlashCommand) and batch:
+                if cmd.aperture not in flashes:
+                    flashes[cmd.aperture] = (len(geometries), [])
+                    geometries.append(None)
+                flashes[cmd.aperture][1].append((cmd.x, cmd.y))
+                continue
+            if isinstance(cmd, FlashCommand):
+                geom = GeoAperture(cmd)
+            elif isinstance(cmd, RegionCommand):
+                geom = GeoRegion(cmd)
+            elif isinstance(cmd, DrawCommand):
+                geom = GeoDraw(cmd)
+            elif isinstance(cmd, ArcCommand):
+                # arcs are tessellated together once the whole list is known
+                geom = GeoArc(cmd)
+                arcs.append(geom)
+                geometries.append(geom)
+                continue
+            else:
+                continue
+            geom.command_to_geometry()
+
+            geometries.append(geom)
+        tessellate_geometries(arcs)
+        for aperture, (pos, centers) in flashes.items():
+            geom = GeoFlashBatch(aperture, centers)
+            geom.command_to_geometry()
+            geometries[pos] = geom
+        return geometries
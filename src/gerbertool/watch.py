@@ -0,0 +1,210 @@
+import argparse
+import copy
+import hashlib
+import os
+import time
+import zlib
+from parser import GerberParser
+from apertures import ApertureTable
+from transformer import ScaleTransformer
+from sources import GZIP_MAGIC
+from export_pipeline import GeometrySnapshot, ExportOrchestrator
+
+#Module for watching a gerber file and reparsing only what changed
+
+BLOCK_SIZE = 1 << 16
+# parser attributes that header lines change and a restart has to put back
+HEADER_STATE = ('units', 'zero_suppression', 'coord_mode', 'int_digits', 'frac_digits', 'divisor',
+                'int_digits_x', 'frac_digits_x', 'int_digits_y', 'frac_digits_y', 'div_x', 'div_y')
+
+
+def block_hashes(data, block_size=BLOCK_SIZE):
+    return [hashlib.blake2b(data[i:i + block_size], digest_size=16).digest()
+            for i in range(0, len(data), block_size)]
+
+
+def read_source(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:2] == GZIP_MAGIC:
+        data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    return data
+
+
+class IncrementalParser(GerberParser):
+    # every run() hashes the file in blocks and restarts the command parser at the last
+    # checkpoint before the first changed block; commands before it are kept as they are
+    def __init__(self, filepath, block_size=BLOCK_SIZE):
+        super().__init__(filepath)
+        self.block_size = block_size
+        self.hashes = []
+        # (byte offset, commands before it, (last_x, last_y, aperture), header state)
+        self.checkpoints = []
+        self.reused_bytes = 0
+        self._offset = 0
+        self._line = ''
+        self._next_checkpoint = 0
+        self._prefix = 0
+
+    def run(self):
+        data = read_source(self.filepath)
+        hashes = block_hashes(data, self.block_size)
+        changed = next((k for k, (a, b) in enumerate(zip(self.hashes, hashes)) if a != b),
+                       min(len(self.hashes), len(hashes)))
+        limit = changed * self.block_size
+        # a full block past the old end may have grown, so the last old block is redone too
+        if changed == len(self.hashes) and changed:
+            limit = (changed - 1) * self.block_size
+        usable = [cp for cp in self.checkpoints if cp[0] <= limit]
+        self.hashes = hashes
+
+        if usable and hashes:
+            offset, count, resume, state = usable[-1]
+            commands = self.commands[:count]
+            self._restore(state)
+        else:
+            offset, count, resume = 0, 0, None
+            commands = []
+            self._reset()
+        self.checkpoints = usable[:-1] if usable else []
+        self.reused_bytes = offset
+        self._prefix = count
+        self._next_checkpoint = offset
+
+        self.commands = []
+        lines = self._header_lines(self._lines_from(data, offset))
+        for _ in self._iter_parsed(lines, resume=resume, checkpoint=self._checkpoint):
+            pass
+        self.commands = commands + self.commands
+        return self.commands
+
+    def _lines_from(self, data, offset):
+        # same lines as _stream_lines, with the byte offset of the current one in self._offset
+        pos = offset
+        for raw in data[offset:].split(b'\n'):
+            self._offset = pos
+            pos += len(raw) + 1
+            line = raw.decode('utf-8', 'replace').strip()
+            if line:
+                self._line = line
+                yield line
+
+    def _checkpoint(self, last_x, last_y, current_ap):
+        # header lines have already been applied when this runs, so none is a restart point
+        if self._offset < self._next_checkpoint or self._line[0] == '%' or self._line.startswith(('G70', 'G71')):
+            return
+        self.checkpoints.append((self._offset, self._prefix + len(self.commands),
+                                 (last_x, last_y, current_ap), self._snapshot()))
+        self._next_checkpoint = self._offset + self.block_size
+
+    def _snapshot(self):
+        state = {name: getattr(self, name) for name in HEADER_STATE if hasattr(self, name)}
+        state['apertures'] = ApertureTable(self.apertures)
+        state['macro_defs'] = dict(self.macro_defs)
+        state['macro_params'] = copy.copy(self.macro_params)
+        return state
+
+    def _restore(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # the snapshot stays reusable for later runs
+        self.apertures = ApertureTable(state['apertures'])
+        self.macro_defs = dict(state['macro_defs'])
+        self.macro_params = copy.copy(state['macro_params'])
+        self._am_block = None
+
+    def _reset(self):
+        fresh = GerberParser(self.filepath)
+        for name in HEADER_STATE + ('apertures', 'macro_defs', 'macro_params'):
+            if hasattr(fresh, name):
+                setattr(self, name, getattr(fresh, name))
+        self._am_block = None
+
+
+class FileWatcher:
+    # polls size and mtime; a change is reported once the file has stopped changing,
+    # so a CAM tool that is still writing is not read half way
+    def __init__(self, path, interval=0.25):
+        self.path = path
+        self.interval = interval
+        self._seen = self._stat()
+        self._pending = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def poll(self):
+        current = self._stat()
+        if current is None or current == self._seen:
+            self._pending = None
+            return False
+        if current != self._pending:
+            self._pending = current
+            return False
+        self._seen, self._pending = current, None
+        return True
+
+    def wait(self):
+        while not self.poll():
+            time.sleep(self.interval)
+
+
+class WatchSession:
+    # one watched layer: incremental parse, scale and the exports that follow every change
+    def __init__(self, path, sx, sy, stroke=False, outputs=None, block_size=BLOCK_SIZE):
+        self.parser = IncrementalParser(path, block_size)
+        self.transformer = ScaleTransformer(sx, sy, stroke=stroke)
+        self.outputs = dict(outputs or {})
+        self.original_geometries = []
+        self.scaled_geometries = []
+        self.timings = {}
+
+    def refresh(self):
+        start = time.perf_counter()
+        cmds = self.parser.run()
+        parsed = time.perf_counter()
+        self.original_geometries, self.scaled_geometries, _ = self.transformer.apply(cmds, self.parser.apertures)
+        scaled = time.perf_counter()
+        self.timings = {'parse': parsed - start, 'scale': scaled - parsed}
+        if self.outputs:
+            snapshot = GeometrySnapshot(self.scaled_geometries, self.transformer.sx, self.transformer.sy,
+                                        cmds, self.parser.apertures)
+            orchestrator = ExportOrchestrator(snapshot, executor='thread')
+            orchestrator.run(self.outputs)
+            self.timings['export'] = time.perf_counter() - scaled
+        self.timings['total'] = time.perf_counter() - start
+        return self.scaled_geometries
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rescale and re-export a gerber file whenever it changes")
+    ap.add_argument('source')
+    ap.add_argument('--sx', type=float, default=1.0)
+    ap.add_argument('--sy', type=float, default=None)
+    ap.add_argument('--stroke', action='store_true')
+    ap.add_argument('--interval', type=float, default=0.25, help="seconds between polls")
+    for fmt in ('dxf', 'pdf', 'svg', 'gerber', 'npz'):
+        ap.add_argument(f'--{fmt}', metavar='FILE', help=f"write a {fmt} export on every change")
+    args = ap.parse_args(argv)
+
+    outputs = {fmt: getattr(args, fmt) for fmt in ('dxf', 'pdf', 'svg', 'gerber', 'npz') if getattr(args, fmt)}
+    sy = args.sx if args.sy is None else args.sy
+    session = WatchSession(args.source, args.sx, sy, args.stroke, outputs)
+    watcher = FileWatcher(args.source, args.interval)
+    try:
+        while True:
+            session.refresh()
+            summary = ", ".join(f"{k} {v:.2f}s" for k, v in session.timings.items())
+            print(f"{args.source}: {len(session.parser.commands)} commands, "
+                  f"{session.parser.reused_bytes} bytes reused ({summary})", flush=True)
+            watcher.wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
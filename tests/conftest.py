@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules are imported flat, as app.py does from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src', 'gerbertool'))
@@ -0,0 +1,55 @@
+import pytest
+from gerbonara import GerberFile
+from parser import GerberParser
+from gerber_writer import GerberExporter
+
+LAYER = """%FSLAX26Y26*%
+%MOMM*%
+%ADD10C,0.25*%
+%ADD11R,1.0X0.5*%
+G01*
+D10*
+X0Y0D02*
+X10000000Y0D01*
+X10000000Y5000000D01*
+G75*
+G03X5000000Y10000000I-5000000J0D01*
+G01*
+D11*
+X2000000Y2000000D03*
+X4000000Y2000000D03*
+G36*
+X20000000Y0D02*
+X30000000Y0D01*
+X30000000Y10000000D01*
+X20000000Y10000000D01*
+X20000000Y0D01*
+G37*
+M02*
+"""
+
+
+@pytest.fixture
+def layer(tmp_path):
+    path = tmp_path / "layer.gbr"
+    path.write_text(LAYER)
+    return path
+
+
+@pytest.mark.parametrize("sx, sy", [(1.0, 1.0), (1.002, 1.002), (1.002, 1.001), (1.0, 1.01)])
+def test_export_opens_in_gerbonara(layer, tmp_path, sx, sy):
+    parser = GerberParser(str(layer))
+    cmds = parser.run()
+    out = tmp_path / "scaled.gbr"
+    GerberExporter(sx, sy, str(out), cmds, parser.apertures).export()
+    # a real reader refuses non-circular apertures in D01/G02/G03 and open regions
+    gerber = GerberFile.open(str(out))
+    assert len(gerber.objects) >= 5
+
+
+def test_isotropic_scale_keeps_circles(layer, tmp_path):
+    parser = GerberParser(str(layer))
+    cmds = parser.run()
+    out = tmp_path / "scaled.gbr"
+    GerberExporter(1.5, 1.5, str(out), cmds, parser.apertures).export()
+    assert "%ADD10C,0.375*%" in out.read_text()
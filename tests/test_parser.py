@@ -0,0 +1,28 @@
+import pytest
+from parser import GerberParser
+
+LAYER = """%FSLAX26Y26*%
+%MOMM*%
+%ADD10C,0.25*%
+%ADD11X*%
+%ADD12C,abc*%
+D10*
+X0Y0D02*
+X1000000Y0D01*
+D11*
+X0Y1000000D03*
+D12*
+X2000000Y0D03*
+M02*
+"""
+
+
+def test_unreadable_aperture_is_skipped(tmp_path):
+    path = tmp_path / "layer.gbr"
+    path.write_text(LAYER)
+    parser = GerberParser(str(path))
+    with pytest.warns(UserWarning, match="cannot be read"):
+        cmds = parser.run()
+    assert parser.apertures.get(10) is not None
+    assert parser.apertures.get(11) is None and parser.apertures.get(12) is None
+    assert len(cmds) == 1
@@ -0,0 +1,61 @@
+import random
+import time
+import numpy as np
+import pytest
+from parser import GerberParser
+from transformer import ScaleTransformer
+from shared_tessellate import SharedMemoryTessellator
+from fixed import NANOMETRE
+
+
+@pytest.fixture(scope="module")
+def layer(tmp_path_factory):
+    rng = random.Random(1)
+    lines = ["%FSLAX26Y26*%", "%MOMM*%", "%ADD10C,0.25*%", "%ADD11R,1.0X0.5*%", "%ADD12O,1.2X0.6*%", "G01*"]
+    for i in range(4000):
+        if i % 500 == 0:
+            lines.append(f"D{11 + i // 500 % 2}*")
+        lines.append(f"X{rng.randint(0, 10**8)}Y{rng.randint(0, 10**8)}D03*")
+    lines.append("D10*")
+    for _ in range(600):
+        x, y = rng.randint(0, 10**8), rng.randint(0, 10**8)
+        lines += ["G36*", f"X{x}Y{y}D02*", f"X{x + 500000}Y{y}D01*", f"X{x + 500000}Y{y + 300000}D01*",
+                  f"X{x}Y{y + 300000}D01*", f"X{x}Y{y}D01*", "G37*"]
+    for _ in range(400):
+        x, y = rng.randint(0, 10**8), rng.randint(0, 10**8)
+        lines += [f"X{x}Y{y}D02*", f"X{x + 1000000}Y{y}D01*"]
+    lines.append("M02*")
+    path = tmp_path_factory.mktemp("layer") / "layer.gbr"
+    path.write_text("\n".join(lines) + "\n")
+    parser = GerberParser(str(path))
+    return parser.run(), parser.apertures
+
+
+def _same(expected, got):
+    assert [type(g) for g in expected] == [type(g) for g in got]
+    for a, b in zip(expected, got):
+        assert a.resolution == b.resolution
+        if a.points is not None:
+            assert a.same_points(b)
+        if hasattr(a, 'centers'):
+            assert np.array_equal(a.centers, b.centers)
+            assert a.outline.same_points(b.outline)
+
+
+@pytest.mark.parametrize("resolution", [None, NANOMETRE])
+def test_matches_batched_serial_apply(layer, resolution):
+    cmds, apertures = layer
+    start = time.perf_counter()
+    orig, scaled, _ = ScaleTransformer(1.003, 1.002, resolution=resolution).apply(cmds, apertures)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SharedMemoryTessellator(ScaleTransformer(1.003, 1.002, resolution=resolution),
+                                 max_workers=2, min_commands=0) as tess:
+        shared_orig, shared_scaled, _ = tess.apply(cmds)
+        _same(orig, shared_orig)
+        _same(scaled, shared_scaled)
+    parallel = time.perf_counter() - start
+
+    # flashes stay batched, so even on one core the processes only add their start-up
+    assert parallel < 3 * serial + 2.0